@@ -0,0 +1,216 @@
+"""Generate a seeded, reproducible credential corpus for benchmarks.
+
+    python -m benchmarks.corpus <output_dir> --size 1G --files 200 --duplicates 0.3 --skew 1.2
+
+The same arguments always produce byte-identical files. Credentials are derived from a counter
+rather than kept in memory, so any size can be generated; a duplicate repeats the credential of
+an earlier counter value, sometimes with different case. The manifest describing the corpus is
+written next to the directory, as <output_dir>.json, so dumper does not take it for input.
+"""
+import argparse
+import json
+import random
+import string
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from dumper.cli import parse_size
+from generate_test_data import DOMAINS
+
+DELIMITERS = {"comma": ",", "semicolon": ";", "colon": ":", "pipe": "|", "tab": "\t"}
+ENCODINGS = ("utf-8", "latin-1", "utf-16")
+
+USERNAME_ALPHABET = string.ascii_lowercase + string.digits
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + "!#$%&*+-.=?^_~"
+# Non-ASCII characters that Latin-1 can encode too
+NON_ASCII = "àáâäçèéêëìíîïñòóôöùúûüß"
+
+MASK = (1 << 64) - 1
+
+# Lines generated and written at once, at most
+WRITE_CHUNK = 10_000
+
+# Rough size of a generated line, to keep small files near their target
+LINE_BYTES = 32
+
+
+def splitmix64(x: int) -> int:
+    x = (x + 0x9E3779B97F4A7C15) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+def encode(x: int, alphabet: str, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        x, i = divmod(x, len(alphabet))
+        chars.append(alphabet[i])
+    return "".join(chars)
+
+
+def credential(k: int, seed: int) -> Tuple[str, str]:
+    """The k-th distinct credential of a corpus."""
+    x = splitmix64(k ^ (seed << 40))
+    y = splitmix64(x)
+    email = f"{encode(x, USERNAME_ALPHABET, 6 + x % 7)}{k % 1000}@{DOMAINS[y % len(DOMAINS)]}"
+    # 16 password characters need more than the 64 bits of y
+    password = encode(splitmix64(y) << 64 | y, PASSWORD_ALPHABET, 8 + y % 9)
+    if y % 10 == 0:
+        password += NON_ASCII[(y >> 4) % len(NON_ASCII)]
+    return email, password
+
+
+def file_sizes(total_size: int, files: int, skew: float, rng: random.Random) -> List[int]:
+    # Zipf-like weights: skew 0 gives equal sizes, larger values a few big files and a long tail
+    weights = [1 / (i + 1) ** skew for i in range(files)]
+    rng.shuffle(weights)
+    return [max(1, int(total_size * weight / sum(weights))) for weight in weights]
+
+
+def manifest_path(corpus_dir: Path) -> Path:
+    corpus_dir = corpus_dir.resolve()
+    return corpus_dir.with_name(f"{corpus_dir.name}.json")
+
+
+def generate_corpus(
+    output_dir: Path,
+    size: int,
+    files: int,
+    seed: int = 0,
+    delimiters: Optional[List[str]] = None,
+    encodings: Optional[List[str]] = None,
+    duplicates: float = 0.2,
+    skew: float = 1.0,
+    junk: float = 0.01,
+) -> Dict[str, Any]:
+    """Write the corpus and its manifest, returning the manifest."""
+    rng = random.Random(seed)
+    delimiters = delimiters or ["comma"]
+    encodings = encodings or ["utf-8"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest: Dict[str, Any] = {
+        "seed": seed,
+        "size": size,
+        "delimiters": delimiters,
+        "encodings": encodings,
+        "duplicates": duplicates,
+        "skew": skew,
+        "junk": junk,
+        "files": [],
+    }
+    next_k = 0
+    for i, target in enumerate(file_sizes(size, files, skew, rng)):
+        delimiter = DELIMITERS[rng.choice(delimiters)]
+        encoding = rng.choice(encodings)
+        file_path = output_dir / f"part_{i:05d}.txt"
+        records = 0
+        written = 0
+        with open(file_path, "w", encoding=encoding, newline="\n") as f:
+            while written < target:
+                lines = []
+                for _ in range(min(WRITE_CHUNK, (target - written) // LINE_BYTES + 1)):
+                    if rng.random() < junk:
+                        lines.append(encode(rng.getrandbits(64), USERNAME_ALPHABET, 12))
+                        continue
+                    if next_k and rng.random() < duplicates:
+                        email, password = credential(rng.randrange(next_k), seed)
+                        if rng.random() < 0.5:
+                            email = email.upper()
+                    else:
+                        email, password = credential(next_k, seed)
+                        next_k += 1
+                    lines.append(f"{email}{delimiter}{password}")
+                    records += 1
+                chunk = "\n".join(lines) + "\n"
+                f.write(chunk)
+                # Close enough for UTF-16 too, which only has to land near the target
+                written += len(chunk) * (2 if encoding == "utf-16" else 1)
+        manifest["files"].append(
+            {
+                "name": file_path.name,
+                "bytes": file_path.stat().st_size,
+                "records": records,
+                "delimiter": delimiter,
+                "encoding": encoding,
+            }
+        )
+
+    manifest["bytes"] = sum(file["bytes"] for file in manifest["files"])
+    manifest["records"] = sum(file["records"] for file in manifest["files"])
+    manifest["distinct_credentials"] = next_k
+    with open(manifest_path(output_dir), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a seeded credential corpus for benchmarks"
+    )
+    parser.add_argument("output_dir", type=Path, help="Directory to write the corpus to")
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("100M"),
+        help="Approximate total size, e.g. 500M or 2G (default: 100M)",
+    )
+    parser.add_argument("--files", type=int, default=20, help="Number of files (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument(
+        "--delimiters",
+        default="comma",
+        help=f"Comma-separated delimiters files pick from: {', '.join(DELIMITERS)} (default: "
+        "comma)",
+    )
+    parser.add_argument(
+        "--encodings",
+        default="utf-8",
+        help=f"Comma-separated encodings files pick from: {', '.join(ENCODINGS)} (default: utf-8)",
+    )
+    parser.add_argument(
+        "--duplicates",
+        type=float,
+        default=0.2,
+        help="Fraction of lines repeating an earlier credential (default: 0.2)",
+    )
+    parser.add_argument(
+        "--skew", type=float, default=1.0, help="File size skew, 0 for equal sizes (default: 1.0)"
+    )
+    parser.add_argument(
+        "--junk",
+        type=float,
+        default=0.01,
+        help="Fraction of lines that are not credentials (default: 0.01)",
+    )
+    parsed_args = parser.parse_args(args)
+
+    delimiters = parsed_args.delimiters.split(",")
+    encodings = parsed_args.encodings.split(",")
+    for chosen, allowed in ((delimiters, DELIMITERS), (encodings, ENCODINGS)):
+        unknown = set(chosen) - set(allowed)
+        if unknown:
+            parser.error(f"Unknown choice: {', '.join(sorted(unknown))}")
+
+    manifest = generate_corpus(
+        parsed_args.output_dir,
+        parsed_args.size,
+        parsed_args.files,
+        parsed_args.seed,
+        delimiters,
+        encodings,
+        parsed_args.duplicates,
+        parsed_args.skew,
+        parsed_args.junk,
+    )
+    print(
+        f"Generated {manifest['records']:,} credentials ({manifest['bytes']:,} bytes) in "
+        f"{parsed_args.output_dir}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Time the pipeline stages on a corpus and print the results as JSON.
+
+    python -m benchmarks.run <corpus_dir> [--stages parse_line,dedup] [--limit 1000000] \\
+        [--output results.json]
+
+Every stage runs in a fresh process, so its peak RSS is its own. parse_file reads the whole
+corpus; parse_line, dedup and write work on its first --limit credentials, loaded before the
+clock starts.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import manifest_path
+from dumper.dedup import dedup_batches, iter_unique_batches
+from dumper.metrics import peak_memory
+from dumper.output import COMPRESSIONS, write_output
+from dumper.parser import DEFAULT_BATCH_SIZE, iter_file_batches, parse_line
+from dumper.profile import detect_delimiter
+from dumper.reader import SNIFF_SIZE, sniff_encoding
+
+DEFAULT_LIMIT = 5_000_000
+
+
+def measure(records: int, func: Callable[[], Any], size: Optional[int] = None) -> Dict[str, Any]:
+    rss_before = peak_memory()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    result = {
+        "records": records,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(records / seconds) if seconds else None,
+        "peak_rss_bytes": peak_memory(),
+        "rss_before_bytes": rss_before,
+    }
+    if size is not None:
+        result["bytes"] = size
+        result["bytes_per_sec"] = round(size / seconds) if seconds else None
+    return result
+
+
+def load_credentials(files: List[Path], limit: int) -> List[List[Tuple[str, str]]]:
+    """Parse the first limit credentials of the corpus, in batches."""
+    batches = []
+    for credentials in itertools.chain.from_iterable(
+        iter_file_batches(str(file_path)) for file_path in files
+    ):
+        batches.append(credentials[:limit])
+        limit -= len(batches[-1])
+        if not limit:
+            break
+    return batches
+
+
+def read_lines(files: List[Path], limit: int) -> List[Tuple[str, str]]:
+    """Read the first limit lines of the corpus with the delimiter of their file."""
+    lines: List[Tuple[str, str]] = []
+    for file_path in files:
+        with open(file_path, "rb") as f:
+            encoding, _ = sniff_encoding(f.read(SNIFF_SIZE))
+        with open(file_path, "r", encoding=encoding, errors="ignore") as f:
+            file_lines = list(itertools.islice(f, limit - len(lines)))
+        delimiter = detect_delimiter(file_lines[:10])
+        lines.extend((line, delimiter) for line in file_lines)
+        if len(lines) >= limit:
+            break
+    return lines
+
+
+def bench_parse_line(files: List[Path], limit: int) -> Dict[str, Any]:
+    lines = read_lines(files, limit)
+
+    def run() -> None:
+        for line, delimiter in lines:
+            parse_line(line, delimiter)
+
+    return measure(len(lines), run)
+
+
+def bench_parse_file(files: List[Path], limit: int) -> Dict[str, Any]:
+    records = 0
+
+    def run() -> None:
+        nonlocal records
+        for file_path in files:
+            for credentials in iter_file_batches(str(file_path), DEFAULT_BATCH_SIZE):
+                records += len(credentials)
+
+    result = measure(0, run, sum(file_path.stat().st_size for file_path in files))
+    result["records"] = records
+    result["records_per_sec"] = round(records / result["seconds"]) if result["seconds"] else None
+    return result
+
+
+def bench_dedup(files: List[Path], limit: int) -> Dict[str, Any]:
+    batches = load_credentials(files, limit)
+    unique = 0
+
+    async def run() -> None:
+        nonlocal unique
+        batch_queue: asyncio.Queue = asyncio.Queue()
+        for batch in batches:
+            batch_queue.put_nowait((0, batch))
+        # Credentials of a unit only count once it ends, as a file does once parsed
+        batch_queue.put_nowait((0, None))
+        batch_queue.put_nowait(None)
+        entries, unique, _, _ = await dedup_batches(batch_queue)
+        for _ in entries:  # sorting happens while the entries are consumed
+            pass
+
+    result = measure(sum(len(batch) for batch in batches), lambda: asyncio.run(run()))
+    result["unique"] = unique
+    return result
+
+
+def bench_write(files: List[Path], limit: int, compression: Optional[str] = None) -> Dict[str, Any]:
+    batches = load_credentials(files, limit)
+
+    async def dedup() -> List[List[Tuple[str, str]]]:
+        batch_queue: asyncio.Queue = asyncio.Queue()
+        for batch in batches:
+            batch_queue.put_nowait((0, batch))
+        # Credentials of a unit only count once it ends, as a file does once parsed
+        batch_queue.put_nowait((0, None))
+        batch_queue.put_nowait(None)
+        entries, _, runs, _ = await dedup_batches(batch_queue)
+        return list(iter_unique_batches(entries, runs, DEFAULT_BATCH_SIZE))
+
+    unique_batches = asyncio.run(dedup())
+    del batches
+
+    async def queued() -> AsyncIterator[List[Tuple[str, str]]]:
+        for batch in unique_batches:
+            yield batch
+
+    with tempfile.TemporaryDirectory(prefix="dumper-bench-") as output_dir:
+        result = measure(
+            sum(len(batch) for batch in unique_batches),
+            lambda: asyncio.run(
+                write_output(Path(output_dir), "bench", queued(), compression=compression)
+            ),
+        )
+        result["bytes"] = sum(path.stat().st_size for path in Path(output_dir).iterdir())
+    result["bytes_per_sec"] = (
+        round(result["bytes"] / result["seconds"]) if result["seconds"] else None
+    )
+    return result
+
+
+STAGES = {
+    "parse_line": bench_parse_line,
+    "parse_file": bench_parse_file,
+    "dedup": bench_dedup,
+    "write": bench_write,
+}
+
+
+def run_stage(stage: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+    # A spawned process starts with a fresh peak RSS, unlike a forked one
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(stage, *args).result()
+
+
+def corpus_files(corpus_dir: Path) -> Tuple[List[Path], Optional[Dict[str, Any]]]:
+    try:
+        with open(manifest_path(corpus_dir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except OSError:
+        return sorted(path for path in corpus_dir.rglob("*") if path.is_file()), None
+    return [corpus_dir / file["name"] for file in manifest["files"]], {
+        key: value for key, value in manifest.items() if key != "files"
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the dumper pipeline stages on a corpus")
+    parser.add_argument(
+        "corpus_dir", type=Path, help="Corpus directory, e.g. from benchmarks.corpus"
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma-separated stages to run (default: {','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help=f"Credentials for parse_line, dedup and write (default: {DEFAULT_LIMIT:,})",
+    )
+    parser.add_argument(
+        "--compress", choices=list(COMPRESSIONS), help="Compress output in the write stage"
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the results to this file instead of stdout"
+    )
+    parsed_args = parser.parse_args(args)
+
+    stages = parsed_args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stage: {', '.join(sorted(unknown))}")
+
+    files, corpus = corpus_files(parsed_args.corpus_dir)
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": corpus
+        or {"files": len(files), "bytes": sum(path.stat().st_size for path in files)},
+        "limit": parsed_args.limit,
+        "stages": {},
+    }
+    for stage in stages:
+        extra = {"write": (parsed_args.compress,)}.get(stage, ())
+        print(f"Running {stage}...", file=sys.stderr)
+        results["stages"][stage] = run_stage(STAGES[stage], files, parsed_args.limit, *extra)
+
+    report = json.dumps(results, indent=2)
+    if parsed_args.output:
+        parsed_args.output.write_text(report + "\n", encoding="utf-8")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,30 @@
 """Dumper - A credential parsing and normalization tool."""
 
+from typing import Any
+
 __version__ = "0.1.0"
 
 # List of system files to ignore
 IGNORED_FILES = {
-    '.DS_Store',  # macOS
-    'Thumbs.db',  # Windows
-    'desktop.ini',  # Windows
-    '.directory',  # KDE
-    '.Trash-1000',  # Linux
-    '.Spotlight-V100',  # macOS
-    '.fseventsd',  # macOS
-    '.TemporaryItems',  # macOS
-    '$RECYCLE.BIN',  # Windows
-    'System Volume Information',  # Windows
+    ".DS_Store",  # macOS
+    "Thumbs.db",  # Windows
+    "desktop.ini",  # Windows
+    ".directory",  # KDE
+    ".Trash-1000",  # Linux
+    ".Spotlight-V100",  # macOS
+    ".fseventsd",  # macOS
+    ".TemporaryItems",  # macOS
+    "$RECYCLE.BIN",  # Windows
+    "System Volume Information",  # Windows
 }
+
+# The embedding API (see dumper.api), imported on first use so that importing dumper stays cheap
+__all__ = ["iter_credentials", "dedup_credentials"]
+
+
+def __getattr__(name: str) -> Any:
+    if name in __all__:
+        from dumper import api
+
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
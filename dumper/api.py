@@ -0,0 +1,116 @@
+"""Streaming API for embedding dumper, with no UI and no event loop.
+
+    import dumper
+
+    failed = []
+    credentials = dumper.iter_credentials("Collection_1", failed=failed)
+    for email, password in dumper.dedup_credentials(credentials):
+        ...
+
+Gives the credentials the CLI would write for the same input, in the same order, as long as no
+file fails to parse (see iter_credentials).
+"""
+import contextlib
+import itertools
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from dumper.dedup import (
+    UNIQUE_ENTRY_BYTES,
+    add_credentials,
+    iter_entries,
+    iter_sorted_entries,
+    iter_unique_batches,
+    write_run,
+)
+from dumper.keys import DEFAULT_NORMALIZE_PROVIDERS, dedup_key
+from dumper.parser import DEFAULT_BATCH_SIZE, iter_file_batches, iter_member_batches
+from dumper.processor import plan_work
+from dumper.walker import walk_files
+
+
+def iter_credentials(
+    path: Union[str, Path],
+    ext: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    rejects: Optional[Counter[str]] = None,
+    failed: Optional[List[Tuple[Path, Exception]]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """Yield the (email, password) credentials of a file, or of every file under a directory.
+
+    Files are walked and parsed in this process as they are found, as the CLI does with one worker:
+    archives and compressed files are read on the fly and every file is sniffed for its layout.
+    ext filters by extension as --ext does. Skipped lines are counted into rejects by reason. A file
+    that fails to parse raises, unless failed is given: then (file, error) is appended to it and
+    the next file parsed. The credentials read before the error have been yielded by then, unlike
+    the CLI, which leaves a failed file out of its output entirely.
+    """
+    input_path = Path(path)
+    for unit in plan_work(walk_files(input_path, ext), input_path, None, ext):
+        try:
+            for credentials in iter_unit_batches(unit, batch_size, ext, rejects):
+                yield from credentials
+        except Exception as e:
+            if failed is None:
+                raise
+            failed.append((unit["file_path"], e))
+
+
+def iter_unit_batches(
+    unit: Dict[str, Any],
+    batch_size: int,
+    ext: Optional[str] = None,
+    rejects: Optional[Counter[str]] = None,
+) -> Iterator[List[Tuple[str, str]]]:
+    if not unit["kind"]:
+        yield from iter_file_batches(
+            str(unit["file_path"]), batch_size, None, None, rejects, unit["profile"]
+        )
+        return
+    for _, _, credentials in iter_member_batches(
+        str(unit["file_path"]), unit["kind"], batch_size, unit["member"], ext, rejects
+    ):
+        if credentials:  # None ends a member
+            yield credentials
+
+
+def dedup_credentials(
+    credentials: Iterable[Tuple[str, str]],
+    max_memory: Optional[int] = None,
+    temp_dir: Optional[Path] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    mode: str = "email",
+    providers: Iterable[str] = DEFAULT_NORMALIZE_PROVIDERS,
+    sort: bool = True,
+) -> Iterator[Tuple[str, str]]:
+    """Yield the first credential of every email, sorted by lowercased email, as the CLI does.
+
+    Emails are compared case-insensitively. mode and providers work as --dedup and
+    --normalize-providers, e.g. mode="pair" keeps every distinct email and password. Everything is
+    kept in memory unless max_memory (bytes) is given; then sorted runs are spilled to temp_dir
+    (default: the system temp directory) whenever it is exceeded and merged at the end, as with
+    --external-sort. Without sort, credentials that fit in memory come in no particular order, as
+    with --unsorted-output.
+    """
+    key = dedup_key(mode, providers)
+    unique: Dict[str, Tuple[int, str, str]] = {}
+    max_entries = max(1, max_memory // UNIQUE_ENTRY_BYTES) if max_memory else None
+    with tempfile.TemporaryDirectory(
+        prefix="dumper-", dir=temp_dir
+    ) if max_memory else contextlib.nullcontext() as spill_dir:
+        runs: List[Path] = []
+        iterator = iter(credentials)
+        rank = 0
+        while batch := list(itertools.islice(iterator, batch_size)):
+            add_credentials(unique, batch, rank, key)
+            rank += len(batch)
+            if spill_dir and max_entries and len(unique) >= max_entries:
+                runs.append(Path(spill_dir) / f"run_{len(runs):06d}")
+                write_run(runs[-1], iter_sorted_entries(unique))
+                unique = {}
+
+        entries = iter_sorted_entries(unique) if sort or runs else iter_entries(unique)
+        for unique_batch in iter_unique_batches(entries, runs, batch_size, key=key):
+            yield from unique_batch
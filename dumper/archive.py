@@ -0,0 +1,105 @@
+import bz2
+import gzip
+import lzma
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from dumper import IGNORED_FILES
+
+# Single-file compression formats by suffix, each read through its stdlib module
+COMPRESSORS: Dict[str, Callable[..., IO[Any]]] = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+}
+
+TAR_SUFFIXES = (".tar", ".tgz", ".tbz", ".tbz2", ".txz") + tuple(
+    f".tar{suffix}" for suffix in COMPRESSORS
+)
+
+
+def archive_kind(file_path: Path) -> Optional[str]:
+    """Tell how a file has to be unpacked from its name: 'tar', 'zip', 'compressed' or None."""
+    name = file_path.name.lower()
+    if name.endswith(TAR_SUFFIXES):
+        return "tar"
+    if name.endswith(".zip"):
+        return "zip"
+    if file_path.suffix.lower() in COMPRESSORS:
+        return "compressed"
+    return None
+
+
+def matches_extension(name: str, ext: Optional[str]) -> bool:
+    # ext may list several extensions, e.g. "txt,csv"
+    return not ext or name.endswith(
+        tuple(f".{extension.strip().lstrip('.')}" for extension in ext.split(","))
+    )
+
+
+def is_wanted(file_path: Path, ext: Optional[str]) -> bool:
+    """Check a file found by the directory walk against --ext.
+
+    Archives are always taken, their members are filtered instead. A compressed file is matched
+    by the name it has without the compression suffix.
+    """
+    kind = archive_kind(file_path)
+    if kind == "compressed":
+        return matches_extension(file_path.stem, ext)
+    return kind is not None or matches_extension(file_path.name, ext)
+
+
+def is_wanted_member(name: str, ext: Optional[str]) -> bool:
+    return os.path.basename(name) not in IGNORED_FILES and matches_extension(name, ext)
+
+
+def list_zip_members(file_path: Path, ext: Optional[str] = None) -> List[str]:
+    # Listing only reads the central directory at the end of the file
+    with zipfile.ZipFile(file_path) as archive:
+        return [
+            info.filename
+            for info in archive.infolist()
+            if not info.is_dir() and is_wanted_member(info.filename, ext)
+        ]
+
+
+def iter_members(
+    file_path: str, kind: str, member: Optional[str] = None, ext: Optional[str] = None
+) -> Generator[Tuple[str, int, IO[bytes]], None, None]:
+    """Yield (member name, uncompressed size, binary stream) for the members of an archive.
+
+    Members are decompressed while they are read and never extracted to disk. A zip can be limited
+    to a single member. A compressed file yields its content once, named '' and sized as on disk.
+    Each stream is only valid until the next member is requested.
+    """
+    if kind == "compressed":
+        with COMPRESSORS[Path(file_path).suffix.lower()](file_path, "rb") as stream:
+            yield "", os.path.getsize(file_path), stream
+
+    elif kind == "zip":
+        with zipfile.ZipFile(file_path) as archive:
+            for info in archive.infolist():
+                if (
+                    info.is_dir()
+                    or not is_wanted_member(info.filename, ext)
+                    or member not in (None, info.filename)
+                ):
+                    continue
+                with archive.open(info) as stream:
+                    yield info.filename, info.file_size, stream
+
+    elif kind == "tar":
+        # Stream mode reads the archive front to back once, whatever compression it uses
+        with tarfile.open(file_path, mode="r|*") as archive:
+            for tar_info in archive:
+                if tar_info.isfile() and is_wanted_member(tar_info.name, ext):
+                    extracted = archive.extractfile(tar_info)
+                    if extracted is not None:
+                        yield tar_info.name, tar_info.size, extracted
+
+    else:
+        raise ValueError(f"Unknown archive kind {kind}")
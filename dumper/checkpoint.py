@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+CHECKPOINT_DIRNAME = ".checkpoint"
+CHECKPOINT_VERSION = 2
+
+# Seconds between checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 600
+
+
+class Checkpointer:
+    """Periodically persists the dedup runs and the work units they fully cover, for resuming.
+
+    Work units are whole files or chunks of large ones. A checkpoint may also hold part of the
+    credentials of units that were still being parsed. Those units are parsed again on resume, and
+    since their credentials get the same ranks again, the copies collapse in the final merge and
+    the output is the same as for an uninterrupted run.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        interval: float,
+        files: List[str],
+        state: Optional[Dict[str, Any]] = None,
+        dedup: str = "email",
+    ) -> None:
+        self.directory = directory
+        self.interval = interval
+        self.files = files
+        self.dedup = dedup  # the runs are sorted and deduplicated by this mode, see dedup_name
+        self.last_save = time.monotonic()
+        self.saved = False
+        # Results of finished units by unit index (one per file or archive member), filled in by the
+        # processor
+        self.results: Dict[int, List[Dict[str, Any]]] = {}
+
+        if state is None:
+            shutil.rmtree(directory, ignore_errors=True)
+            self.completed: Dict[int, List[Dict[str, Any]]] = {}
+            self.runs: List[Path] = []
+            self.total_credentials = 0
+        else:
+            self.completed = {
+                int(index): [load_result(result) for result in results]
+                for index, results in state["completed"].items()
+            }
+            self.runs = [directory / name for name in state["runs"]]
+            self.total_credentials = state["total_credentials"]
+            self.results.update(self.completed)
+
+    def due(self) -> bool:
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, runs: List[Path], finished_files: Set[int], file_counts: Dict[int, int]) -> None:
+        """Record runs as covering every finished unit that also has its result recorded."""
+        newly_completed = {
+            index: self.results[index]
+            for index in finished_files
+            if index in self.results and index not in self.completed
+        }
+        self.completed.update(newly_completed)
+        self.total_credentials += sum(file_counts.get(index, 0) for index in newly_completed)
+
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "files": self.files,
+            "dedup": self.dedup,
+            "completed": {
+                str(index): [dump_result(result) for result in results]
+                for index, results in self.completed.items()
+            },
+            "runs": [run.name for run in runs],
+            "total_credentials": self.total_credentials,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.directory / "state.json.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.directory / "state.json")
+
+        self.runs = list(runs)
+        self.last_save = time.monotonic()
+        self.saved = True
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def checkpoint_dir(output_dir: Path) -> Path:
+    return output_dir / CHECKPOINT_DIRNAME
+
+
+def load_checkpoint(output_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(checkpoint_dir(output_dir) / "state.json", "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == CHECKPOINT_VERSION else None
+
+
+# Result fields holding paths, "source" is only set for archive members
+PATH_FIELDS = ("file_path", "source")
+
+
+def dump_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {**result, **{field: str(result[field]) for field in PATH_FIELDS if field in result}}
+
+
+def load_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {**result, **{field: Path(result[field]) for field in PATH_FIELDS if field in result}}
@@ -1,24 +1,403 @@
 import argparse
 import asyncio
+import csv
+import os
 import sys
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from rich.console import Console
+from dumper.checkpoint import DEFAULT_CHECKPOINT_INTERVAL
+from dumper.index import INDEX_KEYS
+from dumper.keys import DEDUP_MODES, DEFAULT_NORMALIZE_PROVIDERS, dedup_key, parse_dedup_name
+from dumper.lookup import lookup, open_lookup_indexes
+from dumper.merge import find_partial_outputs, merge_outputs
+from dumper.output import COMPRESSIONS, DEFAULT_SHARDS, SHARD_BY
+from dumper.parser import DEFAULT_BATCH_SIZE
+from dumper.processor import (
+    DEFAULT_CHUNK_SIZE,
+    PARTITIONS,
+    UNITS_PER_WORKER,
+    get_output_dir,
+    process_files,
+)
 
-from dumper.processor import process_files
-from dumper.ui import create_file_console, display_header, display_results
 
+def parse_size(value: str) -> int:
+    """Parse a byte size such as 512M or 4G."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    value = value.strip().upper().removesuffix("B")
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
 
-def parse_arguments(args: List[str]) -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Dumper - Credential parsing and normalization tool")
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a shard such as 2/8 (the second of eight)."""
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value!r}, expected i/N")
+    if not 1 <= shard[0] <= shard[1]:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value!r}, i must be between 1 and N")
+    return shard
+
+
+def parse_domains(value: str) -> Tuple[str, ...]:
+    """Parse comma-separated domains such as gmail.com,outlook.com."""
+    domains = tuple(domain.strip().lower() for domain in value.split(",") if domain.strip())
+    if not domains:
+        raise argparse.ArgumentTypeError(f"invalid domains: {value!r}")
+    return domains
+
+
+def argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Dumper - Credential parsing and normalization tool"
+    )
     parser.add_argument("input_path", type=Path, help="Input directory or file path")
-    parser.add_argument("-o", "--output", type=Path, default=Path.cwd(), help="Output directory path (default: current working directory)")
-    parser.add_argument("-e", "--ext", type=str, help="File extensions to process (default: all files)")
-    parser.add_argument("-s", "--split", type=int, help="Split output into files with specified number of lines")
-    parser.add_argument("-n", "--no-ui", action="store_true", help="Disable rich UI and output to report.txt")
-    
-    return parser.parse_args(args)
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=Path.cwd(),
+        help="Output directory path (default: current working directory)",
+    )
+    parser.add_argument(
+        "-e", "--ext", type=str, help="File extensions to process (default: all files)"
+    )
+    parser.add_argument(
+        "-s", "--split", type=int, help="Split output into files with specified number of lines"
+    )
+    parser.add_argument(
+        "-z",
+        "--compress",
+        choices=list(COMPRESSIONS),
+        help="Compress output files with gzip, bz2 or xz",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_BY,
+        help="Write one output file per email domain, or per email hash bucket (see --shards)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=DEFAULT_SHARDS,
+        help=f"Number of hash buckets for --shard-by hash (default: {DEFAULT_SHARDS})",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="email",
+        help="Keep the first credential per email, every distinct email+password pair, or the "
+        "first per email normalized with --normalize-providers (default: email)",
+    )
+    parser.add_argument(
+        "--normalize-providers",
+        type=parse_domains,
+        default=DEFAULT_NORMALIZE_PROVIDERS,
+        help="Email domains that ignore a +tag (and dots, for Gmail) in addresses, for --dedup "
+        f"email-normalized (default: {','.join(DEFAULT_NORMALIZE_PROVIDERS)})",
+    )
+    parser.add_argument(
+        "--unsorted-output",
+        action="store_true",
+        help="Write the output in no particular order, skipping the sort when deduplication fits "
+        "in memory",
+    )
+    parser.add_argument(
+        "-l",
+        "--lookup-index",
+        action="store_true",
+        help="Write a sidecar index next to every output file for 'dumper lookup'",
+    )
+    parser.add_argument(
+        "-n", "--no-ui", action="store_true", help="Disable rich UI and output to report.txt"
+    )
+    parser.add_argument(
+        "--events",
+        choices=["jsonl"],
+        help="Write progress and per-file events to stdout as JSON Lines instead of the rich UI, "
+        "for headless runs",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of parallel parser processes (default: number of CPUs, 1 disables the "
+        "process pool)",
+    )
+    parser.add_argument(
+        "--max-open",
+        type=int,
+        help="Number of files (or chunks) in flight in the worker pool at once, each holding an "
+        f"open file while parsed; the largest goes first (default: {UNITS_PER_WORKER} per worker)",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Number of lines parsed and passed between pipeline stages at once (default: "
+        f"{DEFAULT_BATCH_SIZE:,})",
+    )
+    parser.add_argument(
+        "-m",
+        "--max-memory",
+        type=parse_size,
+        help="Memory budget, e.g. 512M or 4G, for the batches in flight between pipeline stages "
+        "and for deduplication, which spills sorted runs to disk once it exceeds it (default: 1G "
+        "for the batches in flight; deduplication is only bounded with -m or -x)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=parse_size,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Split files larger than this into chunks parsed in parallel by the worker pool, 0 "
+        "disables splitting (default: 256M)",
+    )
+    parser.add_argument(
+        "-x",
+        "--external-sort",
+        action="store_true",
+        help="Spill sorted runs to disk once deduplication exceeds --max-memory and merge them "
+        "at the end, also without -m",
+    )
+    parser.add_argument(
+        "-t",
+        "--temp-dir",
+        type=Path,
+        help="Directory for spilled sort runs (default: system temp directory)",
+    )
+    parser.add_argument(
+        "-i",
+        "--index",
+        type=Path,
+        help="Persistent index of credentials emitted by earlier runs; only credentials not in "
+        "it are written, and they are added to it",
+    )
+    parser.add_argument(
+        "-r",
+        "--incremental",
+        action="store_true",
+        help="Keep a manifest in the output directory and on reruns only parse new files, "
+        "merging them into the previous output",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=int,
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        help="Seconds between checkpoints of parsing and dedup progress in the output directory, "
+        f"0 disables them (default: {DEFAULT_CHECKPOINT_INTERVAL})",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Continue an interrupted run from its last checkpoint"
+    )
+    parser.add_argument(
+        "--index-key",
+        choices=INDEX_KEYS,
+        help="What the index remembers: emails, or email+password pairs (default: pair with "
+        "--dedup pair, email otherwise)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Run as node i of N (e.g. 2/8) and write a partial output for 'dumper merge'; every "
+        "node must see the same input and use the same --chunk-size and --ext",
+    )
+    parser.add_argument(
+        "--partition",
+        choices=PARTITIONS,
+        default="files",
+        help="What --shard splits across nodes: the files (and chunks) to parse, or the email "
+        "keyspace, where every node parses everything but keeps only its emails (default: files)",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        type=Path,
+        help="Write per-stage timings, per-file throughput and skipped line counts to this JSON "
+        "file",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        type=Path,
+        help="Write the run metrics to this file in the Prometheus text format, e.g. for "
+        "node_exporter's textfile collector",
+    )
+    return parser
+
+
+def parse_arguments(args: List[str]) -> argparse.Namespace:
+    parser = argument_parser()
+    parsed_args = parser.parse_args(args)
+    if parsed_args.resume and not parsed_args.checkpoint_interval:
+        parser.error("--resume needs checkpoints, --checkpoint-interval cannot be 0")
+    if parsed_args.lookup_index and parsed_args.compress:
+        parser.error(
+            "--lookup-index needs uncompressed output, it cannot be combined with --compress"
+        )
+    if parsed_args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if parsed_args.max_open is not None and parsed_args.max_open < 1:
+        parser.error("--max-open must be at least 1")
+    if parsed_args.incremental and parsed_args.shard_by == "domain":
+        parser.error(
+            "--incremental cannot be combined with --shard-by domain, there are too many shards "
+            "to merge back"
+        )
+    if parsed_args.incremental and parsed_args.index:
+        parser.error(
+            "--incremental cannot be combined with --index, the previous output would be filtered "
+            "out again"
+        )
+    if parsed_args.shard and (
+        parsed_args.incremental or parsed_args.index or parsed_args.lookup_index
+    ):
+        parser.error(
+            "--shard writes a partial output for 'dumper merge', it cannot be combined with "
+            "--incremental, --index or --lookup-index"
+        )
+    if parsed_args.unsorted_output and (
+        parsed_args.lookup_index or parsed_args.incremental or parsed_args.shard
+    ):
+        parser.error(
+            "--lookup-index, --incremental and --shard need sorted output, they cannot be "
+            "combined with --unsorted-output"
+        )
+    if parsed_args.dedup == "pair" and parsed_args.index_key == "email":
+        parser.error(
+            "--dedup pair writes several credentials per email, an --index-key email index cannot "
+            "tell them apart"
+        )
+    if parsed_args.index_key is None:
+        parsed_args.index_key = "pair" if parsed_args.dedup == "pair" else "email"
+    if parsed_args.lookup_index and parsed_args.dedup == "email-normalized":
+        parser.error(
+            "--lookup-index searches by email, it cannot be combined with --dedup "
+            "email-normalized, whose output is sorted by normalized email"
+        )
+
+    return parsed_args
+
+
+def parse_lookup_arguments(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="dumper lookup", description="Look up emails in output written with --lookup-index"
+    )
+    parser.add_argument("output_dir", type=Path, help="Output directory of a dumper run")
+    parser.add_argument(
+        "emails", nargs="*", help="Emails to look up (default: one per line from stdin)"
+    )
+
+    parsed_args = parser.parse_args(args)
+    if not parsed_args.output_dir.is_dir():
+        parser.error(f"{parsed_args.output_dir} is not a directory")
+    return parsed_args
+
+
+def lookup_main(args: List[str]) -> int:
+    """Print the credentials of every email found as CSV; exits with 1 if none was found."""
+    parsed_args = parse_lookup_arguments(args)
+    indexes = open_lookup_indexes(parsed_args.output_dir)
+    if not indexes:
+        print(
+            f"No indexed output in {parsed_args.output_dir}, run dumper with --lookup-index first",
+            file=sys.stderr,
+        )
+        return 2
+
+    writer = csv.writer(sys.stdout, quoting=csv.QUOTE_ALL)
+    found = False
+    try:
+        for email in parsed_args.emails or sys.stdin:
+            if email.strip():
+                records = lookup(indexes, email)
+                writer.writerows(records)
+                found = found or bool(records)
+    finally:
+        for index in indexes:
+            index.close()
+    return 0 if found else 1
+
+
+def parse_merge_arguments(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="dumper merge",
+        description="Merge the partial outputs of a run sharded with --shard into the final output",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        type=Path,
+        help="Partial output files, or directories to search for them",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=Path.cwd(),
+        help="Output directory path (default: current working directory)",
+    )
+    parser.add_argument(
+        "-s", "--split", type=int, help="Split output into files with specified number of lines"
+    )
+    parser.add_argument(
+        "-z",
+        "--compress",
+        choices=list(COMPRESSIONS),
+        help="Compress output files with gzip, bz2 or xz",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_BY,
+        help="Write one output file per email domain, or per email hash bucket (see --shards)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=DEFAULT_SHARDS,
+        help=f"Number of hash buckets for --shard-by hash (default: {DEFAULT_SHARDS})",
+    )
+
+    parsed_args = parser.parse_args(args)
+    if parsed_args.shards < 1:
+        parser.error("--shards must be at least 1")
+    try:
+        parsed_args.input_name, parsed_args.dedup, parsed_args.partial_files = find_partial_outputs(
+            parsed_args.paths
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    return parsed_args
+
+
+def merge_main(args: List[str]) -> None:
+    parsed_args = parse_merge_arguments(args)
+    output_dir = get_output_dir(parsed_args.output, Path(parsed_args.input_name))
+    # The partial outputs record the --dedup and --normalize-providers they were written with
+    key = dedup_key(*parse_dedup_name(parsed_args.dedup))
+    count, output_files = asyncio.run(
+        merge_outputs(
+            parsed_args.partial_files,
+            output_dir,
+            parsed_args.input_name,
+            parsed_args.split,
+            parsed_args.compress,
+            parsed_args.shard_by,
+            parsed_args.shards,
+            key=key,
+        )
+    )
+    print(
+        f"Merged {count:,} unique credentials from {len(parsed_args.partial_files)} partial files "
+        f"into {len(output_files)} files in {output_dir}",
+        file=sys.stderr,
+    )
 
 
 async def async_main(args: Optional[List[str]] = None) -> None:
@@ -26,24 +405,76 @@ async def async_main(args: Optional[List[str]] = None) -> None:
         args = sys.argv[1:]
 
     parsed_args = parse_arguments(args)
-    
-    output_dir = parsed_args.output / f"{parsed_args.input_path.name}___output"
+    # rich is slow to import, lookup, merge and --help do without it
+    from rich.console import Console
+
+    from dumper.ui import create_file_console, display_header, display_results, write_event
+
+    output_dir = get_output_dir(parsed_args.output, parsed_args.input_path, parsed_args.shard)
     output_dir.mkdir(parents=True, exist_ok=True)
 
     if parsed_args.no_ui:
         console = create_file_console(output_dir / "report.txt")
+    elif parsed_args.events:
+        console = Console(stderr=True)  # keeps stdout to the events
     else:
         console = Console()
 
-    display_header(console, parsed_args)
+    if parsed_args.events:
+        write_event(
+            sys.stdout,
+            "start",
+            input_path=str(parsed_args.input_path),
+            output=str(output_dir),
+            workers=parsed_args.workers,
+        )
+    else:
+        display_header(console, parsed_args)
     results = await process_files(parsed_args, console)
-    display_results(console, results)
+    if parsed_args.events:
+        write_event(
+            sys.stdout,
+            "done",
+            **{
+                key: value
+                for key, value in results.items()
+                if key not in ("results", "failed_files", "metrics")
+            },
+            failed_files=[str(result["file_path"]) for result in results["failed_files"]],
+        )
+    else:
+        display_results(console, results)
+
+    if parsed_args.metrics_json:
+        results["metrics"].write_json(parsed_args.metrics_json)
+    if parsed_args.prometheus_textfile:
+        results["metrics"].write_prometheus(parsed_args.prometheus_textfile)
 
     if parsed_args.no_ui:
         console.file.close()
 
 
+def is_input_path(args: List[str]) -> bool:
+    """Whether args name an input directory or file called like a subcommand, not the subcommand.
+
+    That takes an existing path and no further arguments but those of a run, while the subcommands
+    need paths (or an output directory) of their own.
+    """
+    if not Path(args[0]).exists():
+        return False
+    _, unknown = argument_parser().parse_known_args(args)
+    return not unknown
+
+
 def main(args: Optional[List[str]] = None) -> None:
+    if args is None:
+        args = sys.argv[1:]
+
+    if args[:1] == ["lookup"] and not is_input_path(args):
+        sys.exit(lookup_main(args[1:]))
+    if args[:1] == ["merge"] and not is_input_path(args):
+        merge_main(args[1:])
+        return
     asyncio.run(async_main(args))
 
 
@@ -0,0 +1,339 @@
+import asyncio
+import heapq
+import os
+import time
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from dumper.checkpoint import Checkpointer
+from dumper.keys import DedupKey, entry_key
+from dumper.metrics import Metrics
+from dumper.output import hash_partition
+from dumper.parser import UNIT_FAILED
+
+if TYPE_CHECKING:
+    from rich.progress import TaskID
+
+    from dumper.ui import AnyProgress
+
+# Bits reserved for the position of a credential within its work unit (a file or chunk of one) when
+# ranking
+RANK_SHIFT = 36
+
+# Rough in-memory size of one entry of the dedup mapping, used to decide when to spill a run
+UNIQUE_ENTRY_BYTES = 320
+
+# A deduplicated credential on its way to the writer: (dedup key, rank, email, password)
+Entry = Tuple[str, int, str, str]
+
+
+async def dedup_batches(
+    batch_queue: asyncio.Queue[Any],
+    progress: Optional["AnyProgress"] = None,
+    task_id: Optional["TaskID"] = None,
+    spill_dir: Optional[Path] = None,
+    max_memory: Optional[int] = None,
+    checkpointer: Optional[Checkpointer] = None,
+    metrics: Optional[Metrics] = None,
+    partition: Optional[Tuple[int, int]] = None,
+    key: DedupKey = None,
+    sort: bool = True,
+    unit_groups: Optional[Dict[int, List[int]]] = None,
+) -> Tuple[Iterator[Entry], int, List[Path], int]:
+    """Consume batches from the queue until a None sentinel, keeping the first credential per key.
+
+    Batches of different work units (files, or chunks of large files) may arrive in any order, so
+    every credential is ranked by (unit index, position in unit) and the lowest rank wins. Units are
+    numbered in input order, so this gives the same result as a stable sort of all credentials in
+    file order followed by a first-wins pass. A batch of None marks the end of a unit, and
+    UNIT_FAILED the end of one that failed part way. Everything a failed unit sent is dropped again,
+    from memory and from the runs, and the credentials it displaced or kept out are brought back.
+    unit_groups maps the units of a file split into chunks to all of them (see group_chunks); they
+    are kept or dropped together once all have ended.
+
+    The key is the lowercased email, or what key (see dedup_key) maps a credential to. A dict maps
+    each key to its best (rank, email, password).
+    With a spill_dir, the in-memory state is written out as a sorted run whenever it grows past
+    max_memory and started afresh; iter_unique_batches merges the runs back together. With a
+    checkpointer, the state is also spilled (to the checkpoint directory) whenever one is due.
+    With metrics, the time spent on each batch (not waiting for one) is added to the dedup stage.
+    With a partition of (index, count), only keys in that hash partition are kept; every key
+    keeps all of its credentials, in order, so first-wins is unaffected.
+    Returns the in-memory entries and their count, the spilled runs and the number of credentials
+    of the units kept. Entries are sorted by key, unless sort is off and no run was spilled: then
+    they come in no particular order, straight from the hash table.
+    """
+    loop = asyncio.get_event_loop()
+    unique: Dict[str, Tuple[int, str, str]] = {}
+    runs: List[Path] = list(checkpointer.runs) if checkpointer else []
+    max_entries = max(1, max_memory // UNIQUE_ENTRY_BYTES) if max_memory else None
+    file_offsets: Dict[int, int] = {}
+    finished_files: Set[int] = set()
+    total_credentials = checkpointer.total_credentials if checkpointer else 0
+    # Units not kept yet, with what a failure of theirs has to bring back (see add_credentials)
+    shadows: Dict[int, List[Entry]] = {}
+    pending_credentials = 0
+    # Units that ended while others of their group had not, and whether they succeeded
+    ended: Dict[int, bool] = {}
+    failed_units: Set[int] = set()
+    # The units not kept yet when each run was spilled, a run of a checkpoint may hold any
+    run_units: Dict[Path, Set[int]] = {}
+
+    async def spill(run_dir: Path) -> None:
+        nonlocal unique
+        run_path = run_dir / f"run_{len(runs):06d}"
+        run_dir.mkdir(parents=True, exist_ok=True)
+        # Shadowed entries go along, so the run still holds what a failure brings back
+        shadowed = sorted(
+            entry
+            for shadow in shadows.values()
+            for entry in shadow
+            if entry[1] >> RANK_SHIFT not in failed_units
+        )
+        await loop.run_in_executor(
+            None,
+            write_run,
+            run_path,
+            heapq.merge(iter_sorted_entries(unique), shadowed)
+            if shadowed
+            else iter_sorted_entries(unique),
+        )
+        unique = {}
+        for shadow in shadows.values():
+            shadow.clear()
+        run_units[run_path] = set(shadows)
+        runs.append(run_path)
+
+    async def end_units(indices: List[int], succeeded: bool) -> None:
+        """Keep the credentials of ended units, or drop them all if any of them failed."""
+        nonlocal unique, total_credentials, pending_credentials
+        finished_files.update(indices)
+        unit_credentials = sum(file_offsets.get(file_index, 0) for file_index in indices)
+        pending_credentials -= unit_credentials
+        if succeeded:
+            total_credentials += unit_credentials
+            for file_index in indices:
+                shadows.pop(file_index, None)
+            return
+
+        # Nothing of a file that failed part way is kept, as if it had never been parsed
+        dropped = set(indices)
+        failed_units.update(dropped)
+        for file_index in indices:
+            file_offsets.pop(file_index, None)
+        for credential_key in [
+            credential_key
+            for credential_key, (rank, _, _) in unique.items()
+            if rank >> RANK_SHIFT in dropped
+        ]:
+            del unique[credential_key]
+        for file_index in indices:
+            for _, rank, email, password in shadows.pop(file_index, []):
+                if rank >> RANK_SHIFT not in failed_units:
+                    add_credentials(unique, [(email, password)], rank, key, shadows)
+        for run_path in runs:
+            if run_units.get(run_path, dropped) & dropped:
+                await loop.run_in_executor(None, drop_units, run_path, dropped, key)
+
+    while (batch := await batch_queue.get()) is not None:
+        file_index, credentials = batch
+        busy_start, cpu_start = time.perf_counter(), time.thread_time()
+        if credentials is None or credentials is UNIT_FAILED:
+            # The chunks of a file are kept or dropped together, once they have all ended
+            group = unit_groups.get(file_index, [file_index]) if unit_groups else [file_index]
+            ended[file_index] = credentials is None
+            if all(index in ended for index in group):
+                await end_units(group, all([ended.pop(index) for index in group]))
+        else:
+            if partition:
+                credentials = [
+                    credential
+                    for credential in credentials
+                    if hash_partition(entry_key(key, *credential), partition[1]) == partition[0]
+                ]
+            offset = file_offsets.get(file_index, 0)
+            file_offsets[file_index] = offset + len(credentials)
+            pending_credentials += len(credentials)
+            shadows.setdefault(file_index, [])
+            add_credentials(unique, credentials, (file_index << RANK_SHIFT) + offset, key, shadows)
+
+        if progress and task_id is not None:
+            progress.update(
+                task_id,
+                total=total_credentials + pending_credentials,
+                completed=total_credentials + pending_credentials,
+            )
+
+        if spill_dir and max_entries and len(unique) >= max_entries:
+            await spill(checkpointer.directory if checkpointer else spill_dir)
+        elif checkpointer and checkpointer.due():
+            await spill(checkpointer.directory)
+            checkpointer.save(runs, finished_files, file_offsets)
+        if metrics:
+            metrics.add(
+                "dedup",
+                time.perf_counter() - busy_start,
+                time.thread_time() - cpu_start,
+                records=len(credentials) if credentials else 0,
+            )
+
+    # Units that never ended (their worker died) failed as well
+    if shadows:
+        await end_units(list(shadows), False)
+
+    # A run that already checkpointed is long enough to be worth checkpointing the end of parsing
+    # too
+    if checkpointer and checkpointer.saved:
+        await spill(checkpointer.directory)
+        checkpointer.save(runs, finished_files, file_offsets)
+
+    # Spilled runs are sorted, and only sorted entries merge with them
+    sort = sort or bool(runs)
+    return (
+        iter_sorted_entries(unique) if sort else iter_entries(unique),
+        len(unique),
+        runs,
+        total_credentials,
+    )
+
+
+def add_credentials(
+    unique: Dict[str, Tuple[int, str, str]],
+    credentials: List[Tuple[str, str]],
+    first_rank: int,
+    key: DedupKey = None,
+    shadows: Optional[Dict[int, List[Entry]]] = None,
+) -> None:
+    """Rank credentials from first_rank on, keeping the best ranked one per key in unique.
+
+    shadows maps the units that may still fail to their shadow, the entries to bring back if they
+    do: those the unit's credentials displaced, and those that lost to one of them.
+    """
+    get = unique.get
+    unit = first_rank >> RANK_SHIFT
+    shadow = shadows.get(unit) if shadows else None
+    # Only other units still pending can keep these credentials out
+    others = shadows if shadows and len(shadows) > (shadow is not None) else None
+    if key is None:
+        # The default lowercased email, inlined
+        for rank, (email, password) in enumerate(credentials, first_rank):
+            email_key = email.lower()
+            existing = get(email_key)
+            if existing is None:
+                unique[email_key] = (rank, email, password)
+            elif rank < existing[0]:
+                unique[email_key] = (rank, email, password)
+                if shadow is not None:
+                    shadow.append((email_key, *existing))
+            elif (
+                others and existing[0] >> RANK_SHIFT != unit and existing[0] >> RANK_SHIFT in others
+            ):
+                others[existing[0] >> RANK_SHIFT].append((email_key, rank, email, password))
+        return
+    for rank, (email, password) in enumerate(credentials, first_rank):
+        credential_key = key(email, password)
+        existing = get(credential_key)
+        if existing is None:
+            unique[credential_key] = (rank, email, password)
+        elif rank < existing[0]:
+            unique[credential_key] = (rank, email, password)
+            if shadow is not None:
+                shadow.append((credential_key, *existing))
+        elif others and existing[0] >> RANK_SHIFT != unit and existing[0] >> RANK_SHIFT in others:
+            others[existing[0] >> RANK_SHIFT].append((credential_key, rank, email, password))
+
+
+def write_run(run_path: Path, entries: Iterable[Entry]) -> None:
+    # One record is three lines (rank, email, password); fields come from a single line, so they
+    # never contain a newline
+    with open(run_path, "w", encoding="utf-8", errors="surrogatepass", newline="\n") as run:
+        for _, rank, email, password in entries:
+            run.write(f"{rank}\n{email}\n{password}\n")
+
+
+def drop_units(run_path: Path, units: Set[int], key: DedupKey = None) -> None:
+    """Rewrite a run without the entries of the given units."""
+    temp_path = run_path.with_name(run_path.name + ".tmp")
+    write_run(
+        temp_path,
+        (entry for entry in read_run(run_path, key) if entry[1] >> RANK_SHIFT not in units),
+    )
+    os.replace(temp_path, run_path)
+
+
+def read_run(run_path: Path, key: DedupKey = None) -> Iterator[Entry]:
+    with open(run_path, "r", encoding="utf-8", errors="surrogatepass", newline="\n") as run:
+        for rank in run:
+            email = run.readline()[:-1]
+            password = run.readline()[:-1]
+            yield entry_key(key, email, password), int(rank), email, password
+
+
+def iter_sorted_entries(unique: Dict[str, Tuple[int, str, str]]) -> Iterator[Entry]:
+    for key in sorted(unique):
+        yield (key, *unique[key])
+
+
+def iter_entries(unique: Dict[str, Tuple[int, str, str]]) -> Iterator[Entry]:
+    for key, value in unique.items():
+        yield (key, *value)
+
+
+def iter_unique_batches(
+    entries: Iterator[Entry],
+    runs: List[Path],
+    batch_size: int,
+    previous: Optional[Iterator[Entry]] = None,
+    with_rank: bool = False,
+    key: DedupKey = None,
+) -> Iterator[List[Tuple[Any, ...]]]:
+    """Yield the deduplicated credentials sorted by key, merging any spilled runs.
+
+    Entries are merged on (key, rank), so the first entry of each key is the winner. Runs are read
+    back with the key they were deduplicated by. previous can add the sorted entries of an earlier
+    output, ranked to win over everything else. With with_rank, credentials come as (email,
+    password, rank), for outputs merged later on. Without runs or previous, entries pass through
+    in their own order.
+    """
+    sources = [read_run(run, key) for run in runs] + ([previous] if previous is not None else [])
+    batch: List[Tuple[Any, ...]] = []
+    previous_key = None
+    for credential_key, rank, email, password in (
+        heapq.merge(*sources, entries) if sources else entries
+    ):
+        if credential_key == previous_key:
+            continue
+        previous_key = credential_key
+        batch.append((email, password, rank) if with_rank else (email, password))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def queue_batches(batch_queue: asyncio.Queue[Any]) -> AsyncIterator[List[Tuple[str, str]]]:
+    while (batch := await batch_queue.get()) is not None:
+        yield batch
+
+
+async def put_batch(
+    batch_queue: asyncio.Queue[Any], batch: object, consumer: asyncio.Task[Any]
+) -> None:
+    """Put a batch on a bounded queue, raising the consumer's error instead of blocking on it."""
+    put = asyncio.ensure_future(batch_queue.put(batch))
+    await asyncio.wait({put, consumer}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        consumer.result()
@@ -0,0 +1,74 @@
+import sqlite3
+from pathlib import Path
+from typing import List, Set, Tuple
+
+from dumper.keys import DedupKey, entry_key
+
+# What identifies a credential in the index: the lowercased email (normalized, if the run
+# deduplicates by normalized email), or the lowercased email plus password
+INDEX_KEYS = ("email", "pair")
+
+# Number of keys looked up per query, below SQLite's default limit of bound parameters
+LOOKUP_CHUNK_SIZE = 900
+
+
+def open_index(index_path: Path, index_key: str = "email") -> sqlite3.Connection:
+    """Open (or create) a persistent index of credentials emitted by previous runs.
+
+    index_key names what the index is keyed by (see dedup_name), an existing index keyed by
+    anything else is refused.
+    """
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(index_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID"
+    )
+    connection.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    row = connection.execute("SELECT value FROM meta WHERE name = 'key'").fetchone()
+    if row is None:
+        connection.execute("INSERT INTO meta (name, value) VALUES ('key', ?)", (index_key,))
+        connection.commit()
+    elif row[0] != index_key:
+        connection.close()
+        raise ValueError(f"Index {index_path} is keyed by {row[0]}, not {index_key}")
+
+    return connection
+
+
+def filter_new(
+    connection: sqlite3.Connection, credentials: List[Tuple[str, str]], key: DedupKey = None
+) -> List[Tuple[str, str]]:
+    """Drop credentials already in the index and add the remaining ones to it, keyed by key.
+
+    Batches come sorted by email, so the lookups and inserts walk the index B-tree in order.
+    Nothing is committed until close_index, so a failed run leaves the index untouched.
+    """
+    keys = [entry_key(key, email, password) for email, password in credentials]
+    seen: Set[str] = set()
+    for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[i : i + LOOKUP_CHUNK_SIZE]
+        query = f"SELECT key FROM seen WHERE key IN ({','.join('?' * len(chunk))})"
+        seen.update(row[0] for row in connection.execute(query, chunk))
+
+    if not seen:
+        new_keys = keys
+        new_credentials = credentials
+    else:
+        new = [i for i, key in enumerate(keys) if key not in seen]
+        new_keys = [keys[i] for i in new]
+        new_credentials = [credentials[i] for i in new]
+
+    connection.executemany(
+        "INSERT OR IGNORE INTO seen (key) VALUES (?)", ((key,) for key in new_keys)
+    )
+    return new_credentials
+
+
+def close_index(connection: sqlite3.Connection, commit: bool = True) -> None:
+    if commit:
+        connection.commit()
+    connection.close()
@@ -0,0 +1,68 @@
+import functools
+from typing import Callable, FrozenSet, Iterable, Optional, Tuple
+
+# Maps (email, password) to what dedup compares, see dedup_key; None is the lowercased email
+DedupKey = Optional[Callable[[str, str], str]]
+
+# What makes two credentials duplicates: the same email, the same email and password, or the same
+# email once normalized (see normalized_key)
+DEDUP_MODES = ("email", "pair", "email-normalized")
+
+# Providers whose addresses ignore a +tag for email-normalized; Gmail's also ignore dots
+DEFAULT_NORMALIZE_PROVIDERS = ("gmail.com", "googlemail.com")
+GMAIL_DOMAINS = ("gmail.com", "googlemail.com")
+
+
+def dedup_key(
+    mode: str = "email", providers: Iterable[str] = DEFAULT_NORMALIZE_PROVIDERS
+) -> DedupKey:
+    """The key credentials are deduplicated by under a mode of DEDUP_MODES.
+
+    Keys start with the (lowercased or normalized) email, so entries sorted by key are sorted by
+    email, and pairs of one email are next to each other.
+    """
+    if mode == "pair":
+        return pair_key
+    if mode == "email-normalized":
+        return functools.partial(
+            normalized_key, providers=frozenset(provider.lower() for provider in providers)
+        )
+    return None
+
+
+def dedup_name(mode: str = "email", providers: Iterable[str] = DEFAULT_NORMALIZE_PROVIDERS) -> str:
+    """Name a mode with its settings, e.g. to tell if an earlier output was deduplicated alike."""
+    if mode == "email-normalized":
+        return f"{mode}:{','.join(sorted(provider.lower() for provider in providers))}"
+    return mode
+
+
+def parse_dedup_name(name: str) -> Tuple[str, Tuple[str, ...]]:
+    """The mode and providers named by dedup_name."""
+    mode, _, providers = name.partition(":")
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"unknown dedup mode: {name!r}")
+    return mode, tuple(providers.split(",")) if providers else DEFAULT_NORMALIZE_PROVIDERS
+
+
+def pair_key(email: str, password: str) -> str:
+    # Fields never contain a newline, so it cannot make two different pairs look the same
+    return f"{email.lower()}\n{password}"
+
+
+def normalized_key(
+    email: str, password: str, providers: FrozenSet[str] = frozenset(DEFAULT_NORMALIZE_PROVIDERS)
+) -> str:
+    """The lowercased email, without a +tag (and dots, for Gmail) if its domain is in providers."""
+    key = email.lower()
+    local, _, domain = key.rpartition("@")
+    if domain not in providers:
+        return key
+    local = local.partition("+")[0]
+    if domain in GMAIL_DOMAINS:
+        local = local.replace(".", "")
+    return f"{local}@{domain}"
+
+
+def entry_key(key: DedupKey, email: str, password: str) -> str:
+    return email.lower() if key is None else key(email, password)
@@ -0,0 +1,211 @@
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from dumper.output import DEFAULT_SHARDS, shard_of
+
+LOOKUP_INDEX_SUFFIX = ".idx"
+LOOKUP_INDEX_MAGIC = b"DUMPIDX1"
+LOOKUP_INDEX_VERSION = 1
+
+# Bytes of output covered by one index entry
+INDEX_BLOCK_SIZE = 4096
+
+# Leading bytes of the lowercased email kept per entry, enough to pick a block without reading the
+# output
+KEY_PREFIX_SIZE = 16
+
+ENTRY = struct.Struct(f"<{KEY_PREFIX_SIZE}sQ")
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def lookup_index_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + LOOKUP_INDEX_SUFFIX)
+
+
+def key_prefix(key: str) -> bytes:
+    # Truncating and NUL padding keeps byte order, which for UTF-8 is the order of the str keys
+    return key.encode("utf-8", "surrogatepass")[:KEY_PREFIX_SIZE].ljust(KEY_PREFIX_SIZE, b"\0")
+
+
+def align_to_record(mm: mmap.mmap, position: int) -> int:
+    """Move position forward to the start of the next record.
+
+    Records end in \\r\\n and fields never hold \\n.
+    """
+    if position == 0 or mm[position - 1] == ord("\n"):
+        return position
+    end = mm.find(b"\n", position)
+    return len(mm) if end == -1 else end + 1
+
+
+def read_record(mm: mmap.mmap, start: int) -> Tuple[Tuple[str, str], int]:
+    """Read the output record on the line starting at start, returning it and the next start."""
+    end = mm.find(b"\n", start)
+    end = len(mm) if end == -1 else end + 1
+    line = mm[start:end]
+    if line.count(b'"') == 4:
+        # No quotes inside the fields, so no escaping to undo: "email","password"\r\n
+        email_end = line.index(b'"', 1)
+        email = line[1:email_end].decode("utf-8", "surrogatepass")
+        password = line[email_end + 3 : line.rindex(b'"')].decode("utf-8", "surrogatepass")
+    else:
+        email, password = next(csv.reader([line.decode("utf-8", "surrogatepass")]))
+    return (email, password), end
+
+
+def write_lookup_index(
+    output_file: Path,
+    shard_by: Optional[str] = None,
+    shards: int = DEFAULT_SHARDS,
+    block_size: int = INDEX_BLOCK_SIZE,
+) -> Path:
+    """Write the sidecar index of a sorted output CSV.
+
+    For every block_size bytes of the file, the index holds the byte offset of the first line
+    starting in the block and the prefix of its lowercased email, in fixed-size entries that can
+    be binary searched in place. The header records the last email and the shard the file belongs
+    to, if any, so lookups can skip the file, and the size and mtime of the file it indexes.
+    """
+    entries = []
+    shard = None
+    with open(output_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        stat = os.fstat(f.fileno())
+        position = align_to_record(mm, 1)
+        while position < len(mm):
+            start = align_to_record(mm, position)
+            if start >= len(mm):
+                break
+            (email, _), _ = read_record(mm, start)
+            entries.append(ENTRY.pack(key_prefix(email.lower()), start))
+            if shard is None and shard_by:
+                shard = shard_of(email.lower(), shard_by, shards)
+            position = start + block_size
+        last_key = (
+            read_record(mm, mm.rfind(b"\n", 0, len(mm) - 1) + 1)[0][0].lower() if entries else None
+        )
+
+    header = json.dumps(
+        {
+            "version": LOOKUP_INDEX_VERSION,
+            "block_size": block_size,
+            "shard_by": shard_by,
+            "shards": shards,
+            "shard": shard,
+            "last_key": last_key,
+            "output_size": stat.st_size,
+            "output_mtime_ns": stat.st_mtime_ns,
+        }
+    ).encode("utf-8")
+
+    index_path = lookup_index_path(output_file)
+    temp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(temp_path, "wb") as index_file:
+        index_file.write(LOOKUP_INDEX_MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        index_file.writelines(entries)
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+class LookupIndex:
+    """An output CSV and its sidecar index, both memory-mapped, answering lookups by email."""
+
+    def __init__(self, output_file: Path) -> None:
+        self.output_file = output_file
+        with open(lookup_index_path(output_file), "rb") as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.index[: len(LOOKUP_INDEX_MAGIC)] != LOOKUP_INDEX_MAGIC:
+            raise ValueError(f"{lookup_index_path(output_file)} is not a lookup index")
+        header_length: int = HEADER_LENGTH.unpack_from(self.index, len(LOOKUP_INDEX_MAGIC))[0]
+        self.entries_start = len(LOOKUP_INDEX_MAGIC) + HEADER_LENGTH.size + header_length
+        self.header: Dict[str, Any] = json.loads(
+            self.index[self.entries_start - header_length : self.entries_start]
+        )
+        if self.header["version"] != LOOKUP_INDEX_VERSION:
+            raise ValueError(
+                f"{lookup_index_path(output_file)} has unsupported version {self.header['version']}"
+            )
+        self.count = (len(self.index) - self.entries_start) // ENTRY.size
+
+        with open(output_file, "rb") as f:
+            # An empty file cannot be mapped, but then it has no entries either
+            self.output = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> bytes:
+        # Lets bisect search the key prefixes of the entries in place
+        prefix: bytes = ENTRY.unpack_from(self.index, self.entries_start + i * ENTRY.size)[0]
+        return prefix
+
+    def offset(self, i: int) -> int:
+        offset: int = ENTRY.unpack_from(self.index, self.entries_start + i * ENTRY.size)[1]
+        return offset
+
+    def may_contain(self, key: str) -> bool:
+        if not self.count or key_prefix(key) < self[0] or key > self.header["last_key"]:
+            return False
+        shard_by = self.header["shard_by"]
+        return (
+            not shard_by or shard_of(key, shard_by, self.header["shards"]) == self.header["shard"]
+        )
+
+    def find(self, key: str) -> List[Tuple[str, str]]:
+        """Return the records whose lowercased email is key."""
+        if self.output is None or not self.may_contain(key):
+            return []
+        # Every block before the first with a prefix >= the key's only holds smaller emails
+        block = max(bisect.bisect_left(self, key_prefix(key)) - 1, 0)
+        position = self.offset(block)
+        matches = []
+        while position < len(self.output):
+            record, position = read_record(self.output, position)
+            record_key = record[0].lower()
+            if record_key > key:
+                break
+            if record_key == key:
+                matches.append(record)
+        return matches
+
+    def is_stale(self) -> bool:
+        """Whether the output file changed since the index was written."""
+        stat = self.output_file.stat()
+        return (self.header.get("output_size"), self.header.get("output_mtime_ns")) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+
+    def close(self) -> None:
+        self.index.close()
+        if self.output is not None:
+            self.output.close()
+
+
+def open_lookup_index(output_file: Path) -> LookupIndex:
+    """Open the index of an output file, writing it again first if the output changed since."""
+    index = LookupIndex(output_file)
+    if not index.is_stale():
+        return index
+    index.close()
+    write_lookup_index(
+        output_file, index.header["shard_by"], index.header["shards"], index.header["block_size"]
+    )
+    return LookupIndex(output_file)
+
+
+def open_lookup_indexes(output_dir: Path) -> List[LookupIndex]:
+    return [
+        open_lookup_index(index_path.with_suffix(""))
+        for index_path in sorted(output_dir.glob(f"*.csv{LOOKUP_INDEX_SUFFIX}"))
+    ]
+
+
+def lookup(indexes: List[LookupIndex], email: str) -> List[Tuple[str, str]]:
+    key = email.strip().lower()
+    return [record for index in indexes for record in index.find(key)]
@@ -0,0 +1,132 @@
+import csv
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dumper.keys import DedupKey, entry_key
+from dumper.output import open_output_text
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def load_manifest(output_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(output_dir / MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(output_dir: Path, manifest: Dict[str, Any]) -> None:
+    # Write to a temporary file first so an interrupted save never leaves a truncated manifest
+    temp_path = output_dir / f"{MANIFEST_FILENAME}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp_path, output_dir / MANIFEST_FILENAME)
+
+
+def new_manifest() -> Dict[str, Any]:
+    return {"version": MANIFEST_VERSION, "files": {}, "outputs": []}
+
+
+def hash_file(file_path: Path) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
+
+
+def known_hash(entry: Optional[Dict[str, Any]], file_path: Path, stat: os.stat_result) -> str:
+    """The hash of a file, as recorded in its manifest entry while its size and mtime match."""
+    if entry is not None and (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime):
+        return str(entry["hash"])
+    return hash_file(file_path)
+
+
+def manifest_key(file_path: Path, input_path: Path) -> str:
+    return str(file_path.relative_to(input_path)) if file_path != input_path else file_path.name
+
+
+def file_entry(result: Dict[str, Any], stat: os.stat_result, content_hash: str) -> Dict[str, Any]:
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": content_hash,
+        "records": result["total_lines"],
+        "status": result["status"],
+    }
+
+
+def is_unchanged(entry: Dict[str, Any], file_path: Path, stat: os.stat_result) -> bool:
+    """Check a file against its manifest entry, only hashing it when size or mtime moved."""
+    if entry["size"] != stat.st_size:
+        return False
+    if entry["mtime"] == stat.st_mtime:
+        return True
+    if hash_file(file_path) != entry["hash"]:
+        return False
+    entry["mtime"] = stat.st_mtime
+    return True
+
+
+def plan_incremental(
+    manifest: Dict[str, Any],
+    files: List[Path],
+    input_path: Path,
+    output_dir: Path,
+    dedup: str = "email",
+) -> Tuple[List[Path], List[Path], List[str]]:
+    """Split the current files into ones to parse and ones the previous output already covers.
+
+    The previous output does not record which file each credential came from, so it can only be
+    reused when files were added, or files that failed before can be parsed again. Any modified or
+    removed file, or a different dedup mode (see dedup_name), means everything is parsed again.
+    Returns the files to parse, the previous output files to merge and the keys of skipped files.
+    """
+    previous = manifest["files"]
+    outputs = [output_dir / name for name in manifest["outputs"]]
+    current = {manifest_key(file_path, input_path): file_path for file_path in files}
+
+    if manifest.get("dedup", "email") != dedup:
+        return files, [], []
+    if (
+        not outputs
+        or not all(output.exists() for output in outputs)
+        or not set(previous) <= set(current)
+    ):
+        return files, [], []
+
+    new_files, skipped = [], []
+    for key, file_path in current.items():
+        # A file that failed left nothing in the output, so it is parsed again like a new one
+        if key not in previous or previous[key].get("status") != "success":
+            new_files.append(file_path)
+        elif is_unchanged(previous[key], file_path, file_path.stat()):
+            skipped.append(key)
+        else:
+            return files, [], []
+
+    return new_files, outputs, skipped
+
+
+def read_output(
+    output_files: List[Path], key: DedupKey = None
+) -> Iterator[Tuple[str, int, str, str]]:
+    """Yield the credentials of a previous output as sorted dedup entries winning over new ones.
+
+    Each output file is sorted on its own; shards are merged back into one sorted stream.
+    """
+    return heapq.merge(*[read_output_file(output_file, key) for output_file in output_files])
+
+
+def read_output_file(
+    output_file: Path, key: DedupKey = None
+) -> Iterator[Tuple[str, int, str, str]]:
+    with open_output_text(output_file, "r") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for email, password in reader:
+            yield entry_key(key, email, password), -1, email, password
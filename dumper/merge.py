@@ -0,0 +1,125 @@
+import csv
+import heapq
+import re
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from dumper.dedup import Entry, iter_unique_batches
+from dumper.keys import DedupKey, entry_key, parse_dedup_name
+from dumper.output import DEFAULT_SHARDS, open_output_text, write_output
+from dumper.parser import DEFAULT_BATCH_SIZE
+
+# Columns of a partial output: its credentials carry their rank, so merging keeps the first one.
+# The header of the rank column also names the dedup mode, as rank:<dedup_name>
+PARTIAL_COLUMNS = ("email", "password", "rank")
+
+# <input name>___part-<i>-of-<N>___<timestamp>_<count>[_<shard>][_<part>].csv[.gz|.bz2|.xz]
+PARTIAL_PATTERN = re.compile(
+    r"(?P<input_name>.+)___part-(?P<index>\d+)-of-(?P<count>\d+)___.+\.csv(\.(gz|bz2|xz))?"
+)
+
+
+def partial_name(input_name: str, shard: Tuple[int, int]) -> str:
+    """The input name a --shard i/N run writes its partial output under."""
+    return f"{input_name}___part-{shard[0]}-of-{shard[1]}"
+
+
+def partial_columns(dedup: str) -> Tuple[str, ...]:
+    """The header of a partial output deduplicated by dedup (see dedup_name)."""
+    return (*PARTIAL_COLUMNS[:-1], f"{PARTIAL_COLUMNS[-1]}:{dedup}")
+
+
+def read_partial_dedup(partial_file: Path) -> str:
+    """The dedup mode (see dedup_name) a partial output was written with, from its header."""
+    with open_output_text(partial_file, "r") as f:
+        header = next(csv.reader(f), [])
+    if len(header) != len(PARTIAL_COLUMNS) or not header[-1].startswith(f"{PARTIAL_COLUMNS[-1]}:"):
+        raise ValueError(f"{partial_file} does not record the --dedup it was written with")
+    dedup = header[-1].partition(":")[2]
+    parse_dedup_name(dedup)  # raises on a mode this version does not know
+    return dedup
+
+
+def find_partial_outputs(paths: List[Path]) -> Tuple[str, str, List[Path]]:
+    """Collect the partial output files of one sharded run from files and directories.
+
+    Every part from 1 to N has to be there, all from the same input and deduplicated alike.
+    Returns the input name, the dedup mode (see dedup_name) and the files.
+    """
+    files = []
+    for path in paths:
+        files.extend(
+            sorted(file for file in path.rglob("*") if PARTIAL_PATTERN.fullmatch(file.name))
+            if path.is_dir()
+            else [path]
+        )
+
+    input_names, counts, indices = set(), set(), set()
+    for file in files:
+        match = PARTIAL_PATTERN.fullmatch(file.name)
+        if not match:
+            raise ValueError(f"{file} is not a partial output of a --shard run")
+        input_names.add(match["input_name"])
+        counts.add(int(match["count"]))
+        indices.add(int(match["index"]))
+
+    if not files:
+        raise ValueError("No partial outputs found")
+    if len(input_names) > 1 or len(counts) > 1:
+        raise ValueError(
+            f"Partial outputs of different runs: {', '.join(sorted(input_names))} with "
+            f"{', '.join(map(str, sorted(counts)))} parts"
+        )
+    missing = set(range(1, counts.pop() + 1)) - indices
+    if missing:
+        raise ValueError(f"Missing parts {', '.join(map(str, sorted(missing)))}")
+
+    dedups = {read_partial_dedup(file) for file in files}
+    if len(dedups) > 1:
+        raise ValueError(f"Partial outputs deduplicated differently: {', '.join(sorted(dedups))}")
+    return input_names.pop(), dedups.pop(), files
+
+
+def read_partial_output(partial_file: Path, key: DedupKey = None) -> Iterator[Entry]:
+    with open_output_text(partial_file, "r") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for email, password, rank in reader:
+            yield entry_key(key, email, password), int(rank), email, password
+
+
+async def merge_outputs(
+    partial_files: List[Path],
+    output_dir: Path,
+    input_name: str,
+    split_size: Optional[int] = None,
+    compression: Optional[str] = None,
+    shard_by: Optional[str] = None,
+    shards: int = DEFAULT_SHARDS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    key: DedupKey = None,
+) -> Tuple[int, List[Path]]:
+    """Merge the partial outputs of a sharded run into the final output.
+
+    Each partial file is sorted by (dedup key, rank), so a k-way merge followed by a first-wins
+    pass gives the output a single run over all files would have written. key has to be the one
+    the partial outputs were deduplicated by (see read_partial_dedup). Only one record per file is held at a time. Returns
+    the number of credentials written and the files.
+    """
+    entries = heapq.merge(
+        *[read_partial_output(partial_file, key) for partial_file in partial_files]
+    )
+
+    async def batches() -> AsyncIterator[List[Tuple[str, str]]]:
+        for batch in iter_unique_batches(entries, [], batch_size):
+            yield batch
+
+    return await write_output(
+        output_dir,
+        input_name,
+        batches(),
+        split_size,
+        compression=compression,
+        shard_by=shard_by,
+        shards=shards,
+    )
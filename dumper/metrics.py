@@ -0,0 +1,211 @@
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+STAGES = ("walk", "parse", "dedup", "write")
+
+# Why parse_lines skipped a non-empty line
+REJECT_REASONS = ("comment", "no_delimiter", "invalid_email")
+
+SLOWEST_FILES = 10
+
+T = TypeVar("T")
+
+
+def peak_memory(children: bool = False) -> int:
+    """Peak RSS of this process (or of its largest finished child) in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class Metrics:
+    """Collects per-stage timings, per-file throughput and reject counts of a run.
+
+    Stages overlap (dedup consumes batches while files are still parsed, and the final merge feeds
+    the writer), so each stage adds up the time its own work took rather than a start and end.
+    Work running on executor threads can add to a stage concurrently.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stages = {
+            stage: {"wall_time": 0.0, "cpu_time": 0.0, "records": 0, "bytes": 0, "peak_memory": 0}
+            for stage in STAGES
+        }
+        self.files: List[Dict[str, Any]] = []
+        self.rejects: Counter[str] = Counter()
+        self.totals: Dict[str, Any] = {}
+
+    def add(
+        self,
+        stage: str,
+        wall_time: float = 0.0,
+        cpu_time: float = 0.0,
+        records: int = 0,
+        bytes: int = 0,
+    ) -> None:
+        with self.lock:
+            metrics = self.stages[stage]
+            metrics["wall_time"] += wall_time
+            metrics["cpu_time"] += cpu_time
+            metrics["records"] += records
+            metrics["bytes"] += bytes
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """Add the wall time and this thread's CPU time of the block to stage."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def timed(self, stage: str, iterator: Iterator[T]) -> Iterator[T]:
+        """Pass through an iterator, adding the time spent producing each item to stage."""
+        iterator = iter(iterator)
+        while True:
+            with self.measure(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def finish_stage(self, stage: str, children: bool = False) -> None:
+        # Peak RSS only ever grows, so this is the peak up to the end of the stage
+        memory = max(peak_memory(), peak_memory(children=True) if children else 0)
+        self.stages[stage]["peak_memory"] = max(self.stages[stage]["peak_memory"], memory)
+
+    def record_files(self, results: List[Dict[str, Any]]) -> None:
+        for result in results:
+            self.rejects.update(result.get("rejects", {}))
+            self.files.append(
+                {
+                    "file_path": str(result["file_path"]),
+                    "status": result["status"],
+                    "bytes": result["file_size"],
+                    "records": result["total_lines"],
+                    "wall_time": result["time_taken"],
+                    "cpu_time": result.get("cpu_time", 0.0),
+                    "records_per_sec": rate(result["total_lines"], result["time_taken"]),
+                    "bytes_per_sec": rate(result["file_size"], result["time_taken"]),
+                }
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {
+            stage: {
+                **metrics,
+                "records_per_sec": rate(metrics["records"], metrics["wall_time"]),
+                "bytes_per_sec": rate(metrics["bytes"], metrics["wall_time"])
+                if metrics["bytes"]
+                else None,
+            }
+            for stage, metrics in self.stages.items()
+        }
+        return {
+            "started": self.started,
+            "wall_time": time.time() - self.started,
+            "totals": self.totals,
+            "stages": stages,
+            "rejects": {reason: self.rejects.get(reason, 0) for reason in REJECT_REASONS},
+            "slowest_files": sorted(self.files, key=lambda file: file["wall_time"], reverse=True)[
+                :SLOWEST_FILES
+            ],
+            "files": self.files,
+        }
+
+    def write_json(self, path: Path) -> None:
+        write_atomic(path, json.dumps(self.to_dict(), indent=1))
+
+    def write_prometheus(self, path: Path) -> None:
+        """Write the run metrics in the Prometheus text format.
+
+        The file suits e.g. node_exporter's textfile collector.
+        """
+        data = self.to_dict()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: Dict[str, Any]) -> None:
+            lines.append(f"# HELP dumper_{name} {help_text}")
+            lines.append(f"# TYPE dumper_{name} {kind}")
+            for labels, value in samples.items():
+                lines.append(f"dumper_{name}{labels} {value if value is not None else 'NaN'}")
+
+        for key, name, help_text in (
+            ("wall_time", "stage_wall_seconds", "Time spent in the stage"),
+            ("cpu_time", "stage_cpu_seconds", "CPU time spent in the stage"),
+            ("records", "stage_records", "Records handled by the stage"),
+            ("records_per_sec", "stage_records_per_second", "Stage throughput in records"),
+            ("bytes_per_sec", "stage_bytes_per_second", "Stage throughput in bytes"),
+            ("peak_memory", "stage_peak_memory_bytes", "Peak RSS at the end of the stage"),
+        ):
+            metric(
+                name,
+                "gauge",
+                help_text,
+                {
+                    f'{{stage="{stage}"}}': stage_metrics[key]
+                    for stage, stage_metrics in data["stages"].items()
+                },
+            )
+        metric(
+            "rejected_lines",
+            "gauge",
+            "Lines skipped while parsing, by reason",
+            {f'{{reason="{reason}"}}': count for reason, count in data["rejects"].items()},
+        )
+        metric(
+            "files",
+            "gauge",
+            "Files processed, by status",
+            {
+                f'{{status="{status}"}}': count
+                for status, count in Counter(file["status"] for file in self.files).items()
+            }
+            or {'{status="success"}': 0},
+        )
+        metric(
+            "run_totals",
+            "gauge",
+            "Run totals",
+            {
+                f'{{total="{name}"}}': value
+                for name, value in data["totals"].items()
+                if isinstance(value, (int, float))
+            },
+        )
+        metric(
+            "run_wall_seconds", "gauge", "Wall time of the run", {"": round(data["wall_time"], 6)}
+        )
+        metric("run_timestamp_seconds", "gauge", "Start of the run", {"": round(self.started, 3)})
+        write_atomic(path, "\n".join(lines) + "\n")
+
+
+def measured(metrics: Optional[Metrics], stage: str, func: Callable[..., T], *args: Any) -> T:
+    """Call func, adding its time to stage; for work handed to an executor thread."""
+    if metrics is None:
+        return func(*args)
+    with metrics.measure(stage):
+        return func(*args)
+
+
+def rate(amount: float, seconds: float) -> Optional[float]:
+    return round(amount / seconds, 1) if seconds > 0 else None
+
+
+def write_atomic(path: Path, text: str) -> None:
+    # Collectors may read the file at any moment, so it is replaced in one step
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
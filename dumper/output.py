@@ -1,44 +1,262 @@
 import asyncio
 import csv
+import re
+import time
+import zlib
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import IO, TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
-import humanize
-from rich.progress import Progress, TaskID
+from dumper.archive import COMPRESSORS
+from dumper.metrics import Metrics
 
+if TYPE_CHECKING:
+    from rich.progress import TaskID
 
-async def write_output(output_dir: Path, input_name: str, credentials: List[Tuple[str, str]], split_size: int = None, progress: Progress = None, task_id: TaskID = None) -> None:
+    from dumper.ui import AnyProgress
+
+# Output compression: (file suffix, options for the stdlib opener)
+COMPRESSIONS = {
+    "gzip": (".gz", {"compresslevel": 6}),
+    "bz2": (".bz2", {}),
+    "xz": (".xz", {}),
+}
+
+SHARD_BY = ("domain", "hash")
+DEFAULT_SHARDS = 16
+
+OUTPUT_COLUMNS = ("email", "password")
+
+# Writes queued on the executor before the writer waits for some to finish
+MAX_PENDING_WRITES = 8
+
+# Shard files kept open at once; more are closed and reopened for appending when written again
+MAX_OPEN_FILES = 128
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[^a-z0-9._-]")
+
+
+class OutputFile:
+    """One output file. Its writes are chained so they run in order on the default executor,
+    while writes to different files run concurrently.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        compression: Optional[str] = None,
+        columns: Tuple[str, ...] = OUTPUT_COLUMNS,
+    ) -> None:
+        self.path = path
+        self.compression = compression
+        self.columns = columns
+        self.count = 0
+        self.created = False
+        self.handle: Optional[IO[str]] = None
+        self.writer: Any = None
+        self.pending: Optional[asyncio.Future[None]] = None
+        self.cpu_time = 0.0  # spent encoding, compressing and writing, on executor threads
+
+    def write(self, rows: List[Tuple[str, str]]) -> asyncio.Future[None]:
+        self.count += len(rows)
+        return self.chain(self.write_rows, rows)
+
+    def close(self) -> asyncio.Future[None]:
+        return self.chain(self.close_now)
+
+    def chain(self, func: Callable[..., None], *args: Any) -> asyncio.Future[None]:
+        async def run(previous: Optional[asyncio.Future[None]]) -> None:
+            if previous is not None:
+                await previous
+            await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+        self.pending = asyncio.ensure_future(run(self.pending))
+        return self.pending
+
+    def write_rows(self, rows: List[Tuple[str, str]]) -> None:
+        cpu_start = time.thread_time()
+        if self.handle is None:
+            # Appending to a compressed file adds a new stream, which readers decompress as one
+            self.handle = open_output_text(
+                self.path, "a" if self.created else "w", self.compression
+            )
+            self.writer = csv.writer(self.handle, quoting=csv.QUOTE_ALL)
+            if not self.created:
+                self.writer.writerow(self.columns)
+                self.created = True
+        self.writer.writerows(rows)
+        self.cpu_time += time.thread_time() - cpu_start
+
+    def close_now(self) -> None:
+        if self.handle is not None:
+            cpu_start = time.thread_time()
+            self.handle.close()
+            self.handle = None
+            self.cpu_time += time.thread_time() - cpu_start
+
+
+async def write_output(
+    output_dir: Path,
+    input_name: str,
+    batches: AsyncIterator[List[Tuple[str, str]]],
+    split_size: Optional[int] = None,
+    progress: Optional["AnyProgress"] = None,
+    task_id: Optional["TaskID"] = None,
+    compression: Optional[str] = None,
+    shard_by: Optional[str] = None,
+    shards: int = DEFAULT_SHARDS,
+    metrics: Optional[Metrics] = None,
+    columns: Tuple[str, ...] = OUTPUT_COLUMNS,
+) -> Tuple[int, List[Path]]:
+    """Write sorted credential batches as they arrive, starting a new file every split_size lines.
+
+    With shard_by, every credential goes to the file of its shard: its email domain, or a hash of
+    its email modulo shards. Each shard is sorted and split on its own. Files are written
+    concurrently on the default executor, optionally compressed.
+
+    The total goes into the file names but is only known once every batch has been written, so
+    files are written under a .partial name and renamed at the end. Rows are written as they come
+    under a header of columns, the first of which must be the email. With metrics, the CPU time of
+    the writes and the records and bytes written are added to the write stage.
+    Returns the number of credentials written and the files written.
+    """
     output_dir.mkdir(parents=True, exist_ok=True)
-    
+
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-    base_filename = f"{input_name}___{timestamp}_{humanize.metric(len(credentials))}".replace(" ", "")
-    
-    total_credentials = len(credentials)
+    partial_filename = f"{input_name}___{timestamp}"
+
+    current: Dict[str, OutputFile] = {}
+    parts: Dict[str, int] = {}
+    output_files: List[Tuple[str, int, OutputFile]] = []
+    open_files: Dict[OutputFile, None] = {}  # ordered from least to most recently written
+    in_flight: Set[asyncio.Future[None]] = set()
     credentials_written = 0
 
-    if split_size:
-        for i, chunk in enumerate(split_list(credentials, split_size), 1):
-            filename = f"{base_filename}_{i}.csv"
-            await write_csv(output_dir / filename, chunk)
-            credentials_written += len(chunk)
+    async def wait_writes(limit: int) -> None:
+        nonlocal in_flight
+        while len(in_flight) > limit:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                future.result()
+
+    def start_file(shard: str) -> OutputFile:
+        part = parts[shard] = parts.get(shard, 0) + 1
+        output_file = OutputFile(
+            output_dir / f"{partial_filename}_{shard}_{part}.partial", compression, columns
+        )
+        current[shard] = output_file
+        output_files.append((shard, part, output_file))
+        return output_file
+
+    def write(output_file: OutputFile, rows: List[Tuple[str, str]]) -> None:
+        in_flight.add(output_file.write(rows))
+        open_files.pop(output_file, None)
+        open_files[output_file] = None
+        if len(open_files) > MAX_OPEN_FILES:
+            in_flight.add(close(next(iter(open_files))))
+
+    def close(output_file: OutputFile) -> asyncio.Future[None]:
+        open_files.pop(output_file, None)
+        return output_file.close()
+
+    try:
+        async for batch in batches:
+            for shard, rows in shard_rows(batch, shard_by, shards).items():
+                start = 0
+                while start < len(rows):
+                    output_file = current.get(shard)
+                    if output_file is None or (split_size and output_file.count >= split_size):
+                        if output_file is not None:
+                            in_flight.add(close(output_file))
+                        output_file = start_file(shard)
+
+                    end = (
+                        min(len(rows), start + split_size - output_file.count)
+                        if split_size
+                        else len(rows)
+                    )
+                    write(output_file, rows[start:end])
+                    start = end
+
+            credentials_written += len(batch)
+            await wait_writes(MAX_PENDING_WRITES)
             if progress and task_id:
                 progress.update(task_id, completed=credentials_written)
-    else:
-        filename = f"{base_filename}.csv"
-        await write_csv(output_dir / filename, credentials)
-        if progress and task_id:
-            progress.update(task_id, completed=total_credentials)
-
-async def write_csv(file_path: Path, data: List[Tuple[str, str]]) -> None:
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, write_csv_sync, file_path, data)
-
-def write_csv_sync(file_path: Path, data: List[Tuple[str, str]]) -> None:
-    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
-        writer.writerow(['email', 'password'])
-        writer.writerows(data)
-
-def split_list(lst: List, n: int) -> List[List]:
-    return [lst[i:i + n] for i in range(0, len(lst), n)]
+
+        # Without splitting or sharding, an empty result still gets a file with just the header
+        if not output_files and not split_size and not shard_by:
+            write(start_file(""), [])
+
+        for output_file in list(open_files):
+            in_flight.add(close(output_file))
+        await wait_writes(0)
+    finally:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        for _, _, output_file in output_files:
+            output_file.close_now()
+
+    import humanize  # only needed here, importing it is slow
+
+    base_filename = f"{input_name}___{timestamp}_{humanize.metric(credentials_written)}".replace(
+        " ", ""
+    )
+    suffix = ".csv" + (COMPRESSIONS[compression][0] if compression else "")
+    final_files = []
+    for shard, part, output_file in output_files:
+        final_file = output_dir / (
+            base_filename
+            + (f"_{shard}" if shard_by else "")
+            + (f"_{part}" if split_size else "")
+            + suffix
+        )
+        output_file.path.replace(final_file)
+        final_files.append(final_file)
+
+    if metrics:
+        metrics.add(
+            "write",
+            cpu_time=sum(output_file.cpu_time for _, _, output_file in output_files),
+            records=credentials_written,
+            bytes=sum(final_file.stat().st_size for final_file in final_files),
+        )
+
+    return credentials_written, final_files
+
+
+def shard_rows(
+    batch: List[Tuple[str, str]], shard_by: Optional[str], shards: int = DEFAULT_SHARDS
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Group a batch by shard name, keeping the order of the batch within each shard."""
+    if not shard_by:
+        return {"": batch}
+    groups: Dict[str, List[Tuple[str, str]]] = {}
+    for credential in batch:
+        groups.setdefault(shard_of(credential[0].lower(), shard_by, shards), []).append(credential)
+    return groups
+
+
+def shard_of(key: str, shard_by: str, shards: int = DEFAULT_SHARDS) -> str:
+    """Name the shard of a lowercased email."""
+    if shard_by == "domain":
+        return UNSAFE_FILENAME_CHARS.sub("_", key.rpartition("@")[2]) or "_"
+    return f"{hash_partition(key, shards):0{len(str(shards - 1))}d}"
+
+
+def hash_partition(key: str, count: int) -> int:
+    # crc32 rather than hash(), which is salted per process, so partitions are stable across runs
+    # and machines
+    return zlib.crc32(key.encode("utf-8", "surrogatepass")) % count
+
+
+def open_output_text(file_path: Path, mode: str, compression: Optional[str] = None) -> IO[str]:
+    """Open an output CSV for text, through the stdlib codec of compression (or of its suffix)."""
+    if compression is None:
+        compression = next(
+            (name for name, (suffix, _) in COMPRESSIONS.items() if file_path.suffix == suffix), None
+        )
+    if compression is None:
+        return open(file_path, mode, newline="", encoding="utf-8")
+    suffix, options = COMPRESSIONS[compression]
+    return COMPRESSORS[suffix](
+        file_path, f"{mode}t", newline="", encoding="utf-8", **(options if mode != "r" else {})
+    )
@@ -1,39 +1,83 @@
 import csv
+import functools
 import io
+import itertools
+import mmap
 import os
 import re
-from typing import List, Optional, Tuple
+import time
+from collections import Counter
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 from dumper import IGNORED_FILES
+from dumper.archive import iter_members
+from dumper.profile import (
+    PROFILE_SAMPLE_LINES,
+    Profile,
+    ProfileCache,
+    resolve_profile,
+)
+from dumper.reader import (
+    ASCII_COMPATIBLE,
+    SNIFF_SIZE,
+    PrefixedReader,
+    align_to_line,
+    iter_blocks,
+    iter_stream_blocks,
+    sniff_encoding,
+)
 
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
-def detect_delimiter(sample_lines: List[str]) -> str:
-    delimiters = [',', ';', ':', '\t']
-    delimiter_counts = {d: 0 for d in delimiters}
+# ASCII characters str.splitlines() breaks on but bytes.splitlines() and file iteration do not
+STR_ONLY_LINE_BREAKS = (b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e")
 
-    for line in sample_lines:
-        for d in delimiters:
-            if d in line:
-                delimiter_counts[d] += 1
+# Number of lines parsed per batch handed down the pipeline
+DEFAULT_BATCH_SIZE = 50_000
 
-    most_common_delimiter = max(delimiter_counts, key=delimiter_counts.get)
-    return most_common_delimiter if delimiter_counts[most_common_delimiter] > 0 else ','
+# Sent in place of a unit's None end marker when parsing it failed, so its credentials get dropped
+UNIT_FAILED = False
 
-def parse_line(line: str, delimiter: str) -> Optional[Tuple[str, str]]:
+# What parsing a file by byte range needs to know up front: (encoding, BOM length, profile)
+FileFormat = Tuple[str, int, Profile]
+
+# Queue the worker processes push their batches to, set by init_worker
+_batch_queue: Any = None
+
+
+def parse_line(
+    line: str, delimiter: str, profile: Optional[Profile] = None
+) -> Optional[Tuple[str, str]]:
     line = line.strip()
-    if not line or line.startswith('#'):
+    if not line or line.startswith(("#", profile.comment) if profile else "#"):
         return None
 
     reader = csv.reader(io.StringIO(line), delimiter=delimiter, quotechar='"')
-    parts = next(reader)
+    return parse_fields(next(reader), *(profile[1:3] if profile else (0, 1)))
 
-    if len(parts) >= 2:
-        email, password = parts[:2]
-        email = email.strip()
-        password = password.strip()
+
+def parse_fields(
+    parts: List[str], email_column: int = 0, password_column: int = 1
+) -> Optional[Tuple[str, str]]:
+    if len(parts) > max(email_column, password_column):
+        email = parts[email_column].strip()
+        password = parts[password_column].strip()
 
         # Check for potential inline comment, but only if it's not inside quotes
-        comment_start = password.find(' #')
+        comment_start = password.find(" #")
         if comment_start != -1:
             # Count quotes before potential comment to determine if it's inside quotes
             quote_count = password[:comment_start].count('"') % 2
@@ -41,34 +85,545 @@ def parse_line(line: str, delimiter: str) -> Optional[Tuple[str, str]]:
                 password = password[:comment_start].strip()
 
         # Basic email validation
-        if re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        if EMAIL_PATTERN.match(email):
             return (email, password)
 
     return None
 
-async def parse_file(file_path: str) -> List[Tuple[str, str]]:
-    credentials = []
-    
+
+def line_parser(profile: Profile) -> Callable[..., List[Tuple[str, str]]]:
+    """Pick the parser for a file's profile, called as parser(lines, rejects=rejects).
+
+    All of them give exactly what parse_line would for every line; they differ in speed only.
+    """
+    if profile.quoted:
+        return functools.partial(parse_quoted_lines, profile=profile)
+    if profile[1:3] == (0, 1) and profile.comment == "#":
+        return functools.partial(parse_lines, delimiter=profile.delimiter)
+    return functools.partial(parse_column_lines, profile=profile)
+
+
+def parse_lines(
+    lines: Iterable[str], delimiter: str, rejects: Optional[Counter[str]] = None
+) -> List[Tuple[str, str]]:
+    """Parse a block of email,password lines sharing one delimiter, exactly as parse_line would.
+
+    Unquoted lines are split with str.split, only lines that contain a quote (or characters the csv
+    module treats specially) go through parse_line and its csv.reader. Skipped lines other than
+    blank ones are counted by reason into rejects, if given.
+    """
+    credentials: List[Tuple[str, str]] = []
+    append = credentials.append
+    email_match = EMAIL_PATTERN.match
+    max_length = csv.field_size_limit()
+    comments = no_delimiter = invalid_email = 0
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] == "#":
+            comments += 1
+            continue
+
+        # Quotes, embedded line breaks, NULs and oversized fields are left to the csv module
+        if '"' in line or "\r" in line or "\n" in line or "\x00" in line or len(line) > max_length:
+            result = parse_line(line, delimiter)
+            if result:
+                append(result)
+            elif rejects is not None:
+                rejects[reject_reason(line, delimiter)] += 1
+            continue
+
+        parts = line.split(delimiter, 2)
+        if len(parts) < 2:
+            no_delimiter += 1
+            continue
+
+        email = parts[0].strip()
+        password = parts[1].strip()
+        comment_start = password.find(" #")
+        if comment_start != -1:
+            password = password[:comment_start].strip()
+
+        if email_match(email):
+            append((email, password))
+        else:
+            invalid_email += 1
+
+    if rejects is not None:
+        rejects["comment"] += comments
+        rejects["no_delimiter"] += no_delimiter
+        rejects["invalid_email"] += invalid_email
+    return credentials
+
+
+def parse_column_lines(
+    lines: Iterable[str], profile: Profile, rejects: Optional[Counter[str]] = None
+) -> List[Tuple[str, str]]:
+    """parse_lines for any other column layout or comment prefix, such as user:email:password."""
+    credentials: List[Tuple[str, str]] = []
+    append = credentials.append
+    email_match = EMAIL_PATTERN.match
+    max_length = csv.field_size_limit()
+    delimiter, email_column, password_column = profile[:3]
+    # Splitting off one more field than needed leaves the last column wanted delimited on both ends
+    columns = max(email_column, password_column) + 1
+    comment_prefixes = ("#", profile.comment)
+    comments = no_delimiter = invalid_email = 0
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(comment_prefixes):
+            comments += 1
+            continue
+
+        if '"' in line or "\r" in line or "\n" in line or "\x00" in line or len(line) > max_length:
+            parse_line_into(line, profile, credentials, rejects)
+            continue
+
+        parts = line.split(delimiter, columns)
+        if len(parts) < columns:
+            no_delimiter += 1
+            continue
+
+        email = parts[email_column].strip()
+        password = parts[password_column].strip()
+        comment_start = password.find(" #")
+        if comment_start != -1:
+            password = password[:comment_start].strip()
+
+        if email_match(email):
+            append((email, password))
+        else:
+            invalid_email += 1
+
+    if rejects is not None:
+        rejects["comment"] += comments
+        rejects["no_delimiter"] += no_delimiter
+        rejects["invalid_email"] += invalid_email
+    return credentials
+
+
+def parse_quoted_lines(
+    lines: Iterable[str], profile: Profile, rejects: Optional[Counter[str]] = None
+) -> List[Tuple[str, str]]:
+    """Parse the lines of a file with quoted fields, yielding exactly what parse_line would.
+
+    Runs of lines go through one csv.reader instead of one reader per line.
+    """
+    credentials: List[Tuple[str, str]] = []
+    max_length = csv.field_size_limit()
+    comment_prefixes = ("#", profile.comment)
+    comments = 0
+    run: List[str] = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(comment_prefixes):
+            comments += 1
+            continue
+
+        if "\r" in line or "\n" in line or "\x00" in line or len(line) > max_length:
+            parse_quoted_run(run, profile, credentials, rejects)
+            run = []
+            parse_line_into(line, profile, credentials, rejects)
+            continue
+        run.append(line)
+    parse_quoted_run(run, profile, credentials, rejects)
+
+    if rejects is not None:
+        rejects["comment"] += comments
+    return credentials
+
+
+def parse_quoted_run(
+    lines: List[str],
+    profile: Profile,
+    credentials: List[Tuple[str, str]],
+    rejects: Optional[Counter[str]] = None,
+) -> None:
+    email_column, password_column = profile[1:3]
+    reader = csv.reader(lines, delimiter=profile.delimiter, quotechar='"')
+    parsed = 0
+    try:
+        for parts in reader:
+            # A record read from more than one line had an unclosed quote, parse_line reads its
+            # lines one by one
+            if reader.line_num == parsed + 1:
+                result = parse_fields(parts, email_column, password_column)
+                if result:
+                    credentials.append(result)
+                elif rejects is not None:
+                    rejects[
+                        "invalid_email"
+                        if len(parts) > max(email_column, password_column)
+                        else "no_delimiter"
+                    ] += 1
+            else:
+                for line in lines[parsed : reader.line_num]:
+                    parse_line_into(line, profile, credentials, rejects)
+            parsed = reader.line_num
+    except csv.Error:
+        # Lines an unclosed quote swallowed into an oversized field
+        for line in lines[parsed:]:
+            parse_line_into(line, profile, credentials, rejects)
+
+
+def parse_line_into(
+    line: str,
+    profile: Profile,
+    credentials: List[Tuple[str, str]],
+    rejects: Optional[Counter[str]] = None,
+) -> None:
+    result = parse_line(line, profile.delimiter, profile)
+    if result:
+        credentials.append(result)
+    elif rejects is not None:
+        rejects[reject_reason(line, profile.delimiter, profile)] += 1
+
+
+def reject_reason(line: str, delimiter: str, profile: Optional[Profile] = None) -> str:
+    """Why parse_line skipped a stripped, non-empty line that is not a comment."""
+    parts = next(csv.reader(io.StringIO(line), delimiter=delimiter, quotechar='"'))
+    return (
+        "invalid_email" if len(parts) > max(profile[1:3] if profile else (0, 1)) else "no_delimiter"
+    )
+
+
+def decode_lines(block: bytes, encoding: str = "utf-8") -> List[str]:
+    """Split a block of an ASCII-compatible encoding into decoded lines.
+
+    Lines break where universal newlines mode would break them.
+
+    Pure ASCII blocks are decoded in one go. str.splitlines() then gives the same lines as
+    bytes.splitlines() unless the block holds one of the ASCII characters only str breaks on.
+    """
+    if block.isascii() and not any(line_break in block for line_break in STR_ONLY_LINE_BREAKS):
+        return block.decode("ascii").splitlines()
+    return [line.decode(encoding, errors="ignore") for line in block.splitlines()]
+
+
+def iter_file_batches(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    byte_range: Optional[Tuple[int, int]] = None,
+    file_format: Optional[FileFormat] = None,
+    rejects: Optional[Counter[str]] = None,
+    profile: Optional[Profile] = None,
+) -> Iterator[List[Tuple[str, str]]]:
+    """Parse a file into batches of credentials.
+
+    With a byte_range, only the lines starting inside it are parsed, so consecutive ranges split a
+    file without losing or repeating a line. Ranges need the file_format sniffed from the start of
+    the file (see sniff_file) and an ASCII-compatible encoding. Without a file_format, the file is
+    parsed with profile, the profile of similar files, if it fits and with its own otherwise.
+    Skipped lines are counted into rejects, as by parse_lines.
+    """
     # Check if the file should be ignored
     if os.path.basename(file_path) in IGNORED_FILES:
-        return credentials
+        return
 
     try:
         if not os.path.isfile(file_path):
-            return credentials  # Silently return empty list for directories or non-existent files
+            return  # Silently yield nothing for directories or non-existent files
 
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            sample_lines = [next(file) for _ in range(10) if file]
-            delimiter = detect_delimiter(sample_lines)
+        with open(file_path, "rb") as file:
+            if file_format is None:
+                encoding, offset = sniff_encoding(file.read(SNIFF_SIZE))
+            else:
+                encoding, offset, profile = file_format
+            if encoding not in ASCII_COMPATIBLE:
+                with open(file_path, "r", encoding=encoding, errors="ignore") as text:
+                    yield from iter_text_batches(text, batch_size, rejects, profile)
+                return
+            if os.fstat(file.fileno()).st_size == 0:
+                return
 
-            file.seek(0)
-            for line in file:
-                result = parse_line(line, delimiter)
-                if result:
-                    credentials.append(result)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if file_format is None or profile is None:
+                    profile = resolve_profile(sample_byte_lines(mm, offset, encoding), profile)
+                start, end = offset, len(mm)
+                if byte_range is not None:
+                    start, end = (align_to_line(mm, position, offset) for position in byte_range)
+                yield from iter_block_batches(
+                    iter_blocks(mm, start, end),
+                    encoding,
+                    profile,
+                    batch_size,
+                    rejects,
+                    start == offset,
+                )
 
     except Exception as e:
-        # Re-raise the exception with additional context, catch and display as a failed file later on
+        # Re-raise the exception with additional context, catch and display as a failed file later
+        # on
         raise Exception(f"Error parsing file {file_path}: {str(e)}") from e
 
-    return credentials
+
+def sniff_file(file_path: str, profile: Optional[Profile] = None) -> FileFormat:
+    """Detect the encoding and profile of a file once, for parsing it by byte ranges or for
+    sharing the profile with similar files. A given profile is kept if it fits the file.
+
+    Files in encodings that cannot be split by byte range (UTF-16/32) are sniffed all the same.
+    """
+    with open(file_path, "rb") as file:
+        encoding, offset = sniff_encoding(file.read(SNIFF_SIZE))
+        if encoding not in ASCII_COMPATIBLE:
+            with open(file_path, "r", encoding=encoding, errors="ignore") as text:
+                return (
+                    encoding,
+                    offset,
+                    resolve_profile(list(itertools.islice(text, PROFILE_SAMPLE_LINES)), profile),
+                )
+        if os.fstat(file.fileno()).st_size == 0:
+            return encoding, offset, resolve_profile([], profile)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return (
+                encoding,
+                offset,
+                resolve_profile(sample_byte_lines(mm, offset, encoding), profile),
+            )
+
+
+def iter_stream_batches(
+    stream: IO[bytes],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    rejects: Optional[Counter[str]] = None,
+    profiles: Optional[ProfileCache] = None,
+    name: str = "",
+) -> Iterator[List[Tuple[str, str]]]:
+    """Parse a binary stream that cannot be mapped, such as a decompressing reader, into batches.
+
+    With profiles, the stream shares its profile with the streams named like it (see profile_key).
+    """
+    head = stream.read(SNIFF_SIZE)
+    encoding, offset = sniff_encoding(head)
+    profile = profiles.get(name) if profiles else None
+    if encoding not in ASCII_COMPATIBLE:
+        text = io.TextIOWrapper(
+            io.BufferedReader(PrefixedReader(head, stream)), encoding=encoding, errors="ignore"
+        )
+        yield from iter_text_batches(text, batch_size, rejects, profile)
+        return
+
+    blocks = iter_stream_blocks(stream, head[offset:])
+    first_block = next(blocks, b"")
+    profile = resolve_profile(sample_byte_lines(first_block, 0, encoding), profile)
+    if profiles is not None:
+        profiles.add(name, profile)
+    yield from iter_block_batches(
+        itertools.chain([first_block], blocks), encoding, profile, batch_size, rejects
+    )
+
+
+def iter_member_batches(
+    file_path: str,
+    kind: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    member: Optional[str] = None,
+    ext: Optional[str] = None,
+    rejects: Optional[Counter[str]] = None,
+) -> Iterator[Tuple[str, int, Optional[List[Tuple[str, str]]]]]:
+    """Parse the members of an archive or compressed file (see archive.iter_members).
+
+    Yields (member name, member size, batch) for every batch and (member name, member size, None)
+    once a member is done. Skipped lines of all members are counted into the one rejects counter.
+    """
+    profiles = ProfileCache()
+    try:
+        for name, size, stream in iter_members(file_path, kind, member, ext):
+            for credentials in iter_stream_batches(stream, batch_size, rejects, profiles, name):
+                yield name, size, credentials
+            yield name, size, None
+    except Exception as e:
+        raise Exception(f"Error parsing file {file_path}: {str(e)}") from e
+
+
+def iter_block_batches(
+    blocks: Iterable[bytes],
+    encoding: str,
+    profile: Profile,
+    batch_size: int,
+    rejects: Optional[Counter[str]] = None,
+    at_start: bool = True,
+) -> Iterator[List[Tuple[str, str]]]:
+    parse = line_parser(profile)
+    skip_header = profile.header and at_start
+    credentials: List[Tuple[str, str]] = []
+    for block in blocks:
+        lines = decode_lines(block, encoding)
+        if skip_header:
+            lines = drop_header(lines, profile)
+            skip_header = False
+        credentials.extend(parse(lines, rejects=rejects))
+        if len(credentials) >= batch_size:
+            yield credentials
+            credentials = []
+    if credentials:
+        yield credentials
+
+
+def drop_header(lines: List[str], profile: Profile) -> List[str]:
+    """The lines without the header row, the first one that is neither blank nor a comment."""
+    for position, line in enumerate(lines):
+        line = line.strip()
+        if line and not line.startswith(("#", profile.comment)):
+            return lines[:position] + lines[position + 1 :]
+    return lines
+
+
+def sample_byte_lines(data: Union[bytes, mmap.mmap], offset: int, encoding: str) -> List[str]:
+    sample_size = SNIFF_SIZE
+    while True:
+        lines = data[offset : offset + sample_size].splitlines()
+        if len(lines) > PROFILE_SAMPLE_LINES or offset + sample_size >= len(data):
+            return decode_lines(b"\n".join(lines[:PROFILE_SAMPLE_LINES]), encoding)
+        sample_size *= 4
+
+
+def iter_text_batches(
+    file: TextIO,
+    batch_size: int,
+    rejects: Optional[Counter[str]] = None,
+    profile: Optional[Profile] = None,
+) -> Iterator[List[Tuple[str, str]]]:
+    """Parse a text stream whose line breaks are not plain bytes (UTF-16/32), reading it once."""
+    sample = list(itertools.islice(file, PROFILE_SAMPLE_LINES))
+    profile = resolve_profile(sample, profile)
+    parse = line_parser(profile)
+
+    lines = sample + list(itertools.islice(file, max(0, batch_size - len(sample))))
+    if profile.header:
+        lines = drop_header(lines, profile)
+    while lines:
+        credentials = parse(lines, rejects=rejects)
+        if credentials:
+            yield credentials
+        lines = list(itertools.islice(file, batch_size))
+
+
+async def parse_file(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    byte_range: Optional[Tuple[int, int]] = None,
+    file_format: Optional[FileFormat] = None,
+    rejects: Optional[Counter[str]] = None,
+    profile: Optional[Profile] = None,
+) -> AsyncIterator[List[Tuple[str, str]]]:
+    for credentials in iter_file_batches(
+        file_path, batch_size, byte_range, file_format, rejects, profile
+    ):
+        yield credentials
+
+
+async def parse_archive(
+    file_path: str,
+    kind: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    member: Optional[str] = None,
+    ext: Optional[str] = None,
+    rejects: Optional[Counter[str]] = None,
+) -> AsyncIterator[Tuple[str, int, Optional[List[Tuple[str, str]]]]]:
+    for item in iter_member_batches(file_path, kind, batch_size, member, ext, rejects):
+        yield item
+
+
+def init_worker(batch_queue: Any) -> None:
+    global _batch_queue
+    _batch_queue = batch_queue
+
+
+def parse_file_streamed(
+    file_path: str,
+    file_index: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    byte_range: Optional[Tuple[int, int]] = None,
+    file_format: Optional[FileFormat] = None,
+    profile: Optional[Profile] = None,
+) -> Dict[str, Any]:
+    """Worker entrypoint: stream packed batches of a file (or a byte range of it) to the queue.
+
+    Batches are put as (file_index, packed credentials), followed by a (file_index, None) end
+    marker, or (file_index, UNIT_FAILED) when parsing fails. Returns the credential count, the
+    seconds and CPU seconds taken and the counts of skipped lines by reason.
+    """
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+    total_lines = 0
+    rejects: Counter[str] = Counter()
+    end: Optional[bool] = UNIT_FAILED
+    try:
+        for credentials in iter_file_batches(
+            file_path, batch_size, byte_range, file_format, rejects, profile
+        ):
+            _batch_queue.put((file_index, pack_credentials(credentials)))
+            total_lines += len(credentials)
+        end = None
+    finally:
+        _batch_queue.put((file_index, end))
+    return parse_stats(total_lines, start_time, start_cpu, rejects)
+
+
+def parse_archive_streamed(
+    file_path: str,
+    file_index: int,
+    kind: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    member: Optional[str] = None,
+    ext: Optional[str] = None,
+) -> List[Tuple[str, int, Dict[str, Any]]]:
+    """Worker entrypoint: stream packed batches of the members of an archive to the batch queue.
+
+    Batches and the end marker go to the queue as for parse_file_streamed. Returns
+    (member name, member size, stats as from parse_file_streamed) for every member.
+    """
+    members = []
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+    total_lines = 0
+    rejects: Counter[str] = Counter()
+    end: Optional[bool] = UNIT_FAILED
+    try:
+        for name, size, credentials in iter_member_batches(
+            file_path, kind, batch_size, member, ext, rejects
+        ):
+            if credentials is None:
+                members.append(
+                    (name, size, parse_stats(total_lines, start_time, start_cpu, rejects))
+                )
+                start_time, start_cpu = time.perf_counter(), time.process_time()
+                total_lines = 0
+                rejects.clear()
+            else:
+                _batch_queue.put((file_index, pack_credentials(credentials)))
+                total_lines += len(credentials)
+        end = None
+    finally:
+        _batch_queue.put((file_index, end))
+    return members
+
+
+def parse_stats(
+    total_lines: int, start_time: float, start_cpu: float, rejects: Counter[str]
+) -> Dict[str, Any]:
+    return {
+        "total_lines": total_lines,
+        "time_taken": time.perf_counter() - start_time,
+        "cpu_time": time.process_time() - start_cpu,
+        "rejects": dict(rejects),
+    }
+
+
+def pack_credentials(credentials: List[Tuple[str, str]]) -> str:
+    # Fields come from a single line, so they can never contain a newline
+    return "\n".join(field for cred in credentials for field in cred)
+
+
+def unpack_credentials(packed: str) -> List[Tuple[str, str]]:
+    if not packed:
+        return []
+    fields = packed.split("\n")
+    return list(zip(fields[::2], fields[1::2]))
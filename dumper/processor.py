@@ -1,131 +1,933 @@
 import asyncio
+import contextlib
+import heapq
+import multiprocessing
+import os
+import queue
+import tempfile
 import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict
-
-from rich.console import Console
-from rich.progress import (
-    BarColumn,
-    Progress,
-    SpinnerColumn,
-    TaskID,
-    TextColumn,
-    TimeRemainingColumn,
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
 )
 
-from dumper import IGNORED_FILES
-from dumper.output import write_output
-from dumper.parser import parse_file
-from dumper.ui import log_processed_file
+from dumper.archive import archive_kind, iter_members, list_zip_members
+from dumper.checkpoint import Checkpointer, checkpoint_dir, load_checkpoint
+from dumper.dedup import dedup_batches, iter_unique_batches, put_batch, queue_batches
+from dumper.index import close_index, filter_new, open_index
+from dumper.keys import DEFAULT_NORMALIZE_PROVIDERS, dedup_key, dedup_name
+from dumper.lookup import lookup_index_path, write_lookup_index
+from dumper.manifest import (
+    file_entry,
+    known_hash,
+    load_manifest,
+    manifest_key,
+    new_manifest,
+    plan_incremental,
+    read_output,
+    save_manifest,
+)
+from dumper.merge import partial_columns, partial_name
+from dumper.metrics import Metrics, measured
+from dumper.output import DEFAULT_SHARDS, OUTPUT_COLUMNS, hash_partition, write_output
+from dumper.parser import (
+    DEFAULT_BATCH_SIZE,
+    UNIT_FAILED,
+    FileFormat,
+    init_worker,
+    parse_archive,
+    parse_archive_streamed,
+    parse_file,
+    parse_file_streamed,
+    sniff_file,
+    unpack_credentials,
+)
+from dumper.profile import Profile, ProfileCache
+from dumper.reader import ASCII_COMPATIBLE
+from dumper.walker import iter_in_thread, walk_files
+
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import TaskID
+
+    from dumper.ui import AnyProgress
+
+# Rough in-memory size of a queued credential, used to turn --max-memory into a queue depth
+BYTES_PER_CREDENTIAL = 128
+
+# Default memory budget for batches in flight between the pipeline stages
+DEFAULT_MAX_MEMORY = 1 << 30
+
+# Files larger than this are split into byte ranges of this size, parsed by separate workers
+DEFAULT_CHUNK_SIZE = 256 << 20
 
+# What --shard splits across nodes
+PARTITIONS = ("files", "emails")
 
-async def process_file(file_path: Path, console: Console, input_path: Path, progress: Progress, task_id: TaskID) -> Dict[str, Any]:
-    if file_path.is_dir() or file_path.name in IGNORED_FILES:
-        progress.advance(task_id)
-        return None
+# Units in flight per worker by default: one being parsed and one queued, so no worker waits
+UNITS_PER_WORKER = 2
 
-    start_time = asyncio.get_event_loop().time()
+
+async def process_file(
+    unit: Dict[str, Any],
+    batch_queue: asyncio.Queue[Any],
+    batch_size: int,
+    ext: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    if unit["kind"]:
+        return await process_archive(unit, batch_queue, batch_size, ext)
+
+    file_path = unit["file_path"]
+    start_time = time.perf_counter()
+    total_lines = 0
+    rejects: Counter[str] = Counter()
+    # Parsing shares this thread with dedup, so only the time between queue puts is parse CPU time
+    cpu_time, cpu_start = 0.0, time.thread_time()
+    end: Optional[bool] = None
     try:
-        credentials = await parse_file(str(file_path))
-        end_time = asyncio.get_event_loop().time()
+        async for credentials in parse_file(
+            str(file_path),
+            batch_size,
+            unit["byte_range"],
+            unit["file_format"],
+            rejects,
+            unit["profile"],
+        ):
+            cpu_time += time.thread_time() - cpu_start
+            await batch_queue.put((unit["index"], credentials))
+            cpu_start = time.thread_time()
+            total_lines += len(credentials)
 
-        result = {
-            "file_path": file_path,
-            "credentials": credentials,
-            "time_taken": end_time - start_time,
-            "total_lines": len(credentials),
-            "file_size": file_path.stat().st_size,
-            "status": "success"
-        }
+        cpu_time += time.thread_time() - cpu_start
+        result = file_result(
+            file_path,
+            {
+                "total_lines": total_lines,
+                "time_taken": time.perf_counter() - start_time,
+                "cpu_time": cpu_time,
+                "rejects": dict(rejects),
+            },
+        )
     except Exception as e:
-        end_time = asyncio.get_event_loop().time()
-        result = {
-            "file_path": file_path,
-            "credentials": [],
-            "time_taken": end_time - start_time,
-            "total_lines": 0,
-            "file_size": file_path.stat().st_size,
-            "status": "failed",
-            "error": str(e),
-            "sample": get_file_sample(file_path)
-        }
+        result = failed_result(unit, e, time.perf_counter() - start_time)
+        end = UNIT_FAILED
+
+    await batch_queue.put((unit["index"], end))
+    return [result]
+
+
+async def process_archive(
+    unit: Dict[str, Any],
+    batch_queue: asyncio.Queue[Any],
+    batch_size: int,
+    ext: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    members = []
+    start_time = time.perf_counter()
+    total_lines = 0
+    rejects: Counter[str] = Counter()
+    cpu_time, cpu_start = 0.0, time.thread_time()
+    end: Optional[bool] = None
+    try:
+        async for name, size, credentials in parse_archive(
+            str(unit["file_path"]), unit["kind"], batch_size, unit["member"], ext, rejects
+        ):
+            cpu_time += time.thread_time() - cpu_start
+            if credentials is None:
+                members.append(
+                    (
+                        name,
+                        size,
+                        {
+                            "total_lines": total_lines,
+                            "time_taken": time.perf_counter() - start_time,
+                            "cpu_time": cpu_time,
+                            "rejects": dict(rejects),
+                        },
+                    )
+                )
+                start_time = time.perf_counter()
+                total_lines = 0
+                cpu_time = 0.0
+                rejects.clear()
+            else:
+                await batch_queue.put((unit["index"], credentials))
+                total_lines += len(credentials)
+            cpu_start = time.thread_time()
+        results = [member_result(unit, *member) for member in members]
+    except Exception as e:
+        results = [failed_result(unit, e, time.perf_counter() - start_time)]
+        end = UNIT_FAILED
+
+    await batch_queue.put((unit["index"], end))
+    return results
+
+
+async def process_file_in_pool(
+    unit: Dict[str, Any], executor: ProcessPoolExecutor, batch_size: int, ext: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    file_path = unit["file_path"]
+    loop = asyncio.get_event_loop()
+    start_time = loop.time()
+    try:
+        if unit["kind"]:
+            members = await loop.run_in_executor(
+                executor,
+                parse_archive_streamed,
+                str(file_path),
+                unit["index"],
+                unit["kind"],
+                batch_size,
+                unit["member"],
+                ext,
+            )
+            return [member_result(unit, *member) for member in members]
+
+        stats = await loop.run_in_executor(
+            executor,
+            parse_file_streamed,
+            str(file_path),
+            unit["index"],
+            batch_size,
+            unit["byte_range"],
+            unit["file_format"],
+            unit["profile"],
+        )
+        result = file_result(file_path, stats)
+    except Exception as e:
+        result = failed_result(unit, e, loop.time() - start_time)
+    return [result]
+
 
-    log_processed_file(console, result, input_path)
-    progress.advance(task_id)
+def file_result(file_path: Path, stats: Dict[str, Any]) -> Dict[str, Any]:
+    # stats holds total_lines, time_taken, cpu_time and rejects, as from parse_file_streamed
+    return {
+        "file_path": file_path,
+        **stats,
+        "file_size": file_path.stat().st_size,
+        "status": "success",
+    }
+
+
+def member_result(
+    unit: Dict[str, Any], name: str, size: int, stats: Dict[str, Any]
+) -> Dict[str, Any]:
+    # Members are listed under their archive; a compressed file has a single member named ''
+    return {
+        "file_path": unit["file_path"] / name,
+        "source": unit["file_path"],
+        **stats,
+        "file_size": size,
+        "status": "success",
+    }
+
+
+def failed_result(unit: Dict[str, Any], error: Exception, time_taken: float) -> Dict[str, Any]:
+    file_path = unit["file_path"]
+    result = {
+        "file_path": file_path / unit["member"] if unit["member"] else file_path,
+        "time_taken": time_taken,
+        "total_lines": 0,
+        "file_size": file_path.stat().st_size,
+        "status": "failed",
+        "error": str(error),
+        "sample": get_file_sample(file_path, unit["kind"], unit["member"]),
+    }
+    if unit["kind"]:
+        result["source"] = file_path
     return result
 
-def get_file_sample(file_path: Path, num_lines: int = 3) -> str:
+
+def get_file_sample(
+    file_path: Path, kind: Optional[str] = None, member: Optional[str] = None, num_lines: int = 3
+) -> str:
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return ''.join(f.readline() for _ in range(num_lines))
+        if kind:
+            # The first member of an archive, decompressed
+            with contextlib.closing(iter_members(str(file_path), kind, member)) as members:
+                _, _, stream = next(members)
+                return "".join(
+                    stream.readline().decode("utf-8", errors="ignore") for _ in range(num_lines)
+                )
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            return "".join(f.readline() for _ in range(num_lines))
     except Exception as e:
         return f"Unable to read file: {str(e)}"
 
-async def process_files(args: Any, console: Console) -> Dict[str, Any]:
+
+def combine_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge the results of parts of a file (e.g. chunks) into one; any failed part fails it."""
+    failed = [result for result in results if result["status"] != "success"]
+    return {
+        **(failed[0] if failed else results[0]),
+        "time_taken": sum(result["time_taken"] for result in results),
+        "total_lines": sum(result["total_lines"] for result in results),
+        "cpu_time": sum(result.get("cpu_time", 0.0) for result in results),
+        "rejects": dict(sum((Counter(result.get("rejects", {})) for result in results), Counter())),
+    }
+
+
+def entry_results(unit_results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Flatten the results of a file's units into one result per file or archive member."""
+    entries: Dict[Path, List[Dict[str, Any]]] = {}
+    for results in unit_results:
+        for result in results:
+            entries.setdefault(result["file_path"], []).append(result)
+    return [combine_results(results) for results in entries.values()]
+
+
+def plan_work(
+    files: Iterable[Tuple[Path, os.stat_result]],
+    input_path: Path,
+    chunk_size: Optional[int] = None,
+    ext: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Turn (file, stat) pairs into work units as they come: whole files, archives, single zip
+    members, or byte ranges of chunk_size for plain files larger than that.
+
+    Unit indices follow file order and then part order within a file, so ranking credentials by
+    (unit index, position in unit) keeps them in the order they appear in the input. All units of
+    a file are planned together.
+
+    Plain files named alike in one directory (see profile_key) get the profile of the first of
+    them, which each is parsed with if it fits. Taking it in file order keeps runs repeatable.
+
+    Every unit has a size in bytes on disk, for scheduling and progress: a chunk its byte range,
+    a zip member an even share of its archive.
+    """
+    index = 0
+    profiles = ProfileCache()
+
+    def unit(
+        file_path: Path,
+        key: str,
+        parts: int,
+        size: int,
+        kind: Optional[str] = None,
+        member: Optional[str] = None,
+        byte_range: Optional[Tuple[int, int]] = None,
+        file_format: Optional[FileFormat] = None,
+        profile: Optional[Profile] = None,
+    ) -> Dict[str, Any]:
+        nonlocal index
+        index += 1
+        return {
+            "index": index - 1,
+            "file_path": file_path,
+            "key": key,
+            "parts": parts,
+            "size": size,
+            "kind": kind,
+            "member": member,
+            "byte_range": byte_range,
+            "file_format": file_format,
+            "profile": profile,
+        }
+
+    for file_path, stat in files:
+        key = manifest_key(file_path, input_path)
+        kind = archive_kind(file_path)
+        if kind == "zip":
+            members: List[Optional[str]]
+            try:
+                members = list(list_zip_members(file_path, ext))
+            except (OSError, zipfile.BadZipFile):
+                members = [None]  # parsing the whole archive reports the error
+            for member in members:
+                yield unit(
+                    file_path,
+                    f"{key}/{member}" if member else key,
+                    len(members),
+                    stat.st_size // len(members),
+                    kind,
+                    member,
+                )
+            continue
+        if kind:
+            yield unit(file_path, key, 1, stat.st_size, kind)
+            continue
+
+        file_format = (
+            sniff_large_file(file_path, profiles.get(file_path))
+            if chunk_size and stat.st_size > chunk_size
+            else None
+        )
+        if not chunk_size or file_format is None:
+            if profiles.shares(file_path):
+                profiles.add(file_path, sniff_profile_of(file_path))
+            yield unit(file_path, key, 1, stat.st_size, profile=profiles.get(file_path))
+            continue
+        profiles.add(file_path, file_format[2])
+        chunks = -(-stat.st_size // chunk_size)
+        for chunk in range(chunks):
+            start = chunk * chunk_size
+            yield unit(
+                file_path,
+                f"{key}#{chunk}",
+                chunks,
+                min(chunk_size, stat.st_size - start),
+                byte_range=(start, start + chunk_size),
+                file_format=file_format,
+            )
+
+
+def group_chunks(
+    units: Iterable[Dict[str, Any]], unit_groups: Dict[int, List[int]]
+) -> Iterator[Dict[str, Any]]:
+    """Pass units through, recording in unit_groups the planned chunks of every chunked file.
+
+    A file fails as a whole, so dedup keeps or drops its chunks together. plan_work yields the
+    chunks of a file one after another, so they are held back until the next unit shows they were
+    all planned (some may have gone to other nodes of a sharded run).
+    """
+    chunks: List[Dict[str, Any]] = []
+
+    def release() -> List[Dict[str, Any]]:
+        indices = [chunk["index"] for chunk in chunks]
+        unit_groups.update((index, indices) for index in indices)
+        return chunks
+
+    for unit in units:
+        if chunks and unit["file_path"] != chunks[0]["file_path"]:
+            yield from release()
+            chunks = []
+        if unit["byte_range"] is not None:
+            chunks.append(unit)
+        else:
+            yield unit
+    yield from release()
+
+
+def sniff_large_file(file_path: Path, profile: Optional[Profile] = None) -> Optional[FileFormat]:
+    """Sniff a plain file for parsing by byte range, None if it cannot be split."""
+    try:
+        file_format = sniff_file(str(file_path), profile)
+    except OSError:
+        return None  # left whole, parsing it reports the error
+    return file_format if file_format[0] in ASCII_COMPATIBLE else None
+
+
+def sniff_profile_of(file_path: Path) -> Optional[Profile]:
+    try:
+        return sniff_file(str(file_path))[2]
+    except (OSError, ValueError):
+        return None  # parsing the file reports the error
+
+
+async def relay_worker_batches(
+    worker_queue: Any,
+    batch_queue: asyncio.Queue[Any],
+    futures: List[asyncio.Future[Any]],
+    planned: asyncio.Event,
+) -> None:
+    """Move packed batches from the worker processes onto the asyncio batch queue.
+
+    Units keep being submitted (and added to futures) until planned is set. Stops once every unit
+    has sent its end marker, or all workers are done and the queue has drained (a worker that
+    died hard never sends its marker).
+    """
+    loop = asyncio.get_event_loop()
+    finished = 0
+    while not planned.is_set() or finished < len(futures):
+        try:
+            unit_index, packed = await loop.run_in_executor(None, worker_queue.get, True, 0.5)
+        except queue.Empty:
+            if planned.is_set() and all(future.done() for future in futures):
+                break
+            continue
+
+        if packed is None or packed is UNIT_FAILED:
+            finished += 1
+            await batch_queue.put((unit_index, packed))
+        else:
+            await batch_queue.put((unit_index, unpack_credentials(packed)))
+
+
+async def parse_files(
+    units: AsyncIterator[Dict[str, Any]],
+    batch_queue: asyncio.Queue[Any],
+    args: Any,
+    progress: "AnyProgress",
+    task_id: "TaskID",
+    checkpointer: Optional[Checkpointer] = None,
+) -> List[Dict[str, Any]]:
+    """Parse work units onto the batch queue as they are planned, each followed by its end marker.
+
+    Units a resumed checkpoint already covers are skipped. With a worker pool, at most max_open
+    units are in flight, and whenever one finishes the largest unit planned so far goes next, so
+    large files start early and the workers end at about the same time. Progress counts the bytes
+    of the units, its total growing as they are planned. Returns one result per file or archive
+    member, in input order, combined from the results of their units.
+    """
+    workers = getattr(args, "workers", 1) or 1
+    batch_size = getattr(args, "batch_size", None) or DEFAULT_BATCH_SIZE
+    ext = getattr(args, "ext", None)
+    max_open = getattr(args, "max_open", None) or UNITS_PER_WORKER * workers
+    unit_results: Dict[int, List[Dict[str, Any]]] = (
+        dict(checkpointer.completed) if checkpointer else {}
+    )
+    file_units: Dict[Path, List[int]] = {}
+    remaining: Counter[Path] = Counter()
+    total_bytes = 0
+
+    def plan(unit: Dict[str, Any]) -> bool:
+        """Register a planned unit, returning whether it still has to be parsed."""
+        nonlocal total_bytes
+        file_units.setdefault(unit["file_path"], []).append(unit["index"])
+        total_bytes += unit["size"]
+        progress.update(task_id, total=total_bytes)
+        if checkpointer:
+            checkpointer.files.append(unit["key"])
+        if unit["index"] in unit_results:
+            progress.advance(task_id, unit["size"])
+            if unit["file_path"] in remaining:
+                log_if_done(unit)  # other units of the file were parsed in this run
+            return False
+        remaining[unit["file_path"]] += 1
+        return True
+
+    def record(unit: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+        unit_results[unit["index"]] = results
+        if checkpointer:
+            checkpointer.results[unit["index"]] = results
+        progress.advance(task_id, unit["size"])
+        remaining[unit["file_path"]] -= 1
+        log_if_done(unit)
+
+    def log_if_done(unit: Dict[str, Any]) -> None:
+        indices = file_units[unit["file_path"]]
+        if (
+            remaining[unit["file_path"]]
+            or len(indices) < unit["parts"]
+            or any(i not in unit_results for i in indices)
+        ):
+            return
+        for result in entry_results([unit_results[i] for i in indices]):
+            progress.log_file(result)
+
+    if workers <= 1:
+        async for unit in units:
+            if plan(unit):
+                record(unit, await process_file(unit, batch_queue, batch_size, ext))
+    else:
+        pending: List[Tuple[int, int, Dict[str, Any]]] = []
+        walked = False
+        arrived = asyncio.Event()
+        slots = asyncio.Semaphore(max_open)
+        futures: List[asyncio.Future[Any]] = []
+        planned = asyncio.Event()
+
+        async def process_in_pool(unit: Dict[str, Any]) -> None:
+            try:
+                record(unit, await process_file_in_pool(unit, executor, batch_size, ext))
+            finally:
+                slots.release()
+
+        async def collect() -> None:
+            nonlocal walked
+            try:
+                async for unit in units:
+                    if plan(unit):
+                        # Largest first, ties in input order
+                        heapq.heappush(pending, (-unit["size"], unit["index"], unit))
+                        arrived.set()
+            finally:
+                walked = True
+                arrived.set()
+
+        async def submit() -> None:
+            collector = asyncio.ensure_future(collect())
+            try:
+                while True:
+                    await slots.acquire()
+                    while not pending and not walked:
+                        arrived.clear()
+                        await arrived.wait()
+                    if not pending or (collector.done() and collector.exception()):
+                        break
+                    _, _, unit = heapq.heappop(pending)
+                    futures.append(asyncio.ensure_future(process_in_pool(unit)))
+                await collector
+            finally:
+                collector.cancel()
+                planned.set()
+
+        worker_queue = multiprocessing.get_context().Queue(maxsize=batch_queue.maxsize)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(worker_queue,)
+        ) as executor:
+            submitter = asyncio.ensure_future(submit())
+            await relay_worker_batches(worker_queue, batch_queue, futures, planned)
+            await submitter
+            await asyncio.gather(*futures)
+
+    return [
+        result
+        for indices in file_units.values()
+        for result in entry_results([unit_results[i] for i in indices])
+    ]
+
+
+async def update_manifest(
+    manifest: Dict[str, Any],
+    output_dir: Path,
+    input_path: Path,
+    results: List[Dict[str, Any]],
+    output_files: List[Path],
+    output_records: int,
+    dedup: str = "email",
+    known_files: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Record the parsed files and the new output, replacing the outputs of the previous run.
+
+    Archive members are recorded as their archive, which is what the next run will find on disk.
+    Only files that are new or changed since their entry in known_files (the manifest's own
+    entries by default) are hashed.
+    """
+    known_files = manifest["files"] if known_files is None else known_files
+    sources: Dict[Path, List[Dict[str, Any]]] = {}
+    for result in results:
+        sources.setdefault(result.get("source", result["file_path"]), []).append(result)
+
+    loop = asyncio.get_event_loop()
+    keys = {source: manifest_key(source, input_path) for source in sources}
+    stats = {source: source.stat() for source in sources}
+    hashes = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                None, known_hash, known_files.get(keys[source]), source, stats[source]
+            )
+            for source in sources
+        ]
+    )
+    for (source, source_results), content_hash in zip(sources.items(), hashes):
+        manifest["files"][keys[source]] = file_entry(
+            combine_results(source_results), stats[source], content_hash
+        )
+    for name in set(manifest["outputs"]) - {output_file.name for output_file in output_files}:
+        (output_dir / name).unlink(missing_ok=True)
+        lookup_index_path(output_dir / name).unlink(missing_ok=True)
+    manifest["outputs"] = [output_file.name for output_file in output_files]
+    manifest["output_records"] = output_records
+    manifest["dedup"] = dedup
+    save_manifest(output_dir, manifest)
+
+
+def get_output_dir(
+    output_path: Path, input_path: Path, shard: Optional[Tuple[int, int]] = None
+) -> Path:
+    output_dir = output_path / f"{input_path.name}___output"
+    # Each node of a sharded run gets a directory of its own, for its report and checkpoints
+    return output_dir / f"part-{shard[0]}-of-{shard[1]}" if shard else output_dir
+
+
+async def process_files(args: Any, console: "Console") -> Dict[str, Any]:
+    # The UI is only loaded here, so that embedding the parser and dedup (see dumper.api) does not
+    # load rich
+    from dumper.ui import AnyProgress, EventProgress, ThrottledProgress, indent_text
+
     input_path = Path(args.input_path)
     output_path = Path(args.output)
     file_extension = args.ext
     split_size = args.split
+    batch_size = getattr(args, "batch_size", None) or DEFAULT_BATCH_SIZE
+    # A memory budget given explicitly bounds deduplication as well, by spilling sorted runs
+    external_sort = getattr(args, "external_sort", False) or bool(getattr(args, "max_memory", None))
+    max_memory = getattr(args, "max_memory", None) or DEFAULT_MAX_MEMORY
+    queue_depth = max(2, max_memory // (batch_size * BYTES_PER_CREDENTIAL))
+    temp_dir = getattr(args, "temp_dir", None)
+    index_path = getattr(args, "index", None)
+    incremental = getattr(args, "incremental", False)
+    checkpoint_interval = getattr(args, "checkpoint_interval", None)
+    resume = getattr(args, "resume", False)
+    workers = getattr(args, "workers", 1) or 1
+    chunk_size = getattr(args, "chunk_size", None)
+    compression = getattr(args, "compress", None)
+    shard_by = getattr(args, "shard_by", None)
+    shards = getattr(args, "shards", None) or DEFAULT_SHARDS
+    lookup_index = getattr(args, "lookup_index", False)
+    shard = getattr(args, "shard", None)
+    partition = getattr(args, "partition", None) or "files"
+    dedup_mode = getattr(args, "dedup", None) or "email"
+    index_key = getattr(args, "index_key", None) or ("pair" if dedup_mode == "pair" else "email")
+    providers = getattr(args, "normalize_providers", None) or DEFAULT_NORMALIZE_PROVIDERS
+    key, dedup = dedup_key(dedup_mode, providers), dedup_name(dedup_mode, providers)
+    sort_output = not getattr(args, "unsorted_output", False)
+    output_dir = get_output_dir(output_path, input_path, shard)
+    # Just the name of the subdirectory (e.g. creddump/folder1 -> folder1)
+    input_name = input_path.name
+    metrics = Metrics()
+    loop = asyncio.get_event_loop()
 
-    files_to_process = []
-    if input_path.is_file():
-        files_to_process.append(input_path)
-    else:
-        glob_pattern = f"*.{file_extension}" if file_extension else "*"
-        files_to_process = list(input_path.rglob(glob_pattern))
-
-    total_files = len(files_to_process)
-
-    progress = Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description:<30}"),
-        TextColumn("[cyan]{task.completed:>10,} of {task.total:<10,}"),
-        BarColumn(bar_width=23),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-        console=console
+    # Walking and planning run on a thread of their own, ahead of parsing
+    files: Iterable[Tuple[Path, os.stat_result]] = walk_files(input_path, file_extension)
+
+    # --- Skipping files the previous output already covers --- #
+    manifest = None
+    known_files: Optional[Dict[str, Any]] = None
+    previous_outputs: List[Path] = []
+    skipped_files: List[str] = []
+    if incremental:
+        # Whether the previous output can be reused depends on every file, so the walk has to finish
+        # first
+        stats = dict(await loop.run_in_executor(None, measured, metrics, "walk", list, files))
+        manifest = load_manifest(output_dir) or new_manifest()
+        files_to_process, previous_outputs, skipped_files = plan_incremental(
+            manifest, list(stats), input_path, output_dir, dedup
+        )
+        if not previous_outputs:
+            stale_outputs = [output_dir / name for name in manifest["outputs"]]
+            # Entries of files that did not change still save hashing them again
+            known_files = manifest["files"]
+            manifest = new_manifest()
+            manifest["outputs"] = [output.name for output in stale_outputs]
+        elif not files_to_process:
+            console.print(
+                indent_text(
+                    f"[yellow]No new or modified files, {input_name} output is up to date[/yellow]"
+                )
+            )
+            save_manifest(output_dir, manifest)  # keep mtimes refreshed by hash checks
+            metrics.add("walk", records=len(stats))
+            metrics.finish_stage("walk")
+            metrics.totals = {
+                "files": 0,
+                "skipped_files": len(skipped_files),
+                "unique_credentials": manifest["output_records"],
+            }
+            return {
+                "total_files": 0,
+                "skipped_files": len(skipped_files),
+                "total_credentials": 0,
+                "unique_credentials": manifest["output_records"],
+                "new_credentials": None,
+                "failed_files": [],
+                "results": [],
+                "metrics": metrics,
+            }
+        files = [(file_path, stats[file_path]) for file_path in files_to_process]
+
+    # --- Splitting large files into byte ranges and archives into members --- #
+    # Sharded runs always chunk, so every node plans the same units whatever its worker count
+    units: Iterable[Dict[str, Any]] = plan_work(
+        files, input_path, chunk_size if workers > 1 or shard else None, file_extension
     )
+    if shard and partition == "files":
+        # Unit indices stay those of the whole plan, so ranks agree across nodes
+        units = (unit for unit in units if hash_partition(unit["key"], shard[1]) == shard[0] - 1)
+    unit_groups: Dict[int, List[int]] = {}
+    units = group_chunks(units, unit_groups)
 
-    with progress:
-        # --- Parsing files --- #
-        file_task = progress.add_task("[magenta]Processing files...", total=total_files)
-        results = await asyncio.gather(*[process_file(file, console, input_path, progress, file_task) for file in files_to_process])
-        results = [result for result in results if result is not None]  # collapse this and filter out None results
+    # --- Picking up where an interrupted run left off --- #
+    checkpointer = None
+    if checkpoint_interval:
+        state = load_checkpoint(output_dir) if resume else None
+        if resume and state is None:
+            console.print(
+                indent_text("[yellow]No checkpoint found, starting from scratch[/yellow]")
+            )
+        elif state is not None:
+            # A checkpoint taken during the walk only knows the units planned by then
+            planned: List[Dict[str, Any]] = await loop.run_in_executor(
+                None, measured, metrics, "walk", list, units
+            )
+            units = planned
+            if [unit["key"] for unit in planned[: len(state["files"])]] != state["files"]:
+                raise ValueError(
+                    "Input files or --chunk-size changed since the checkpoint in "
+                    f"{checkpoint_dir(output_dir)}, cannot resume"
+                )
+            if state.get("dedup", "email") != dedup:
+                raise ValueError(
+                    f"The checkpoint in {checkpoint_dir(output_dir)} was deduplicated by "
+                    f"{state.get('dedup', 'email')}, not {dedup}, cannot resume"
+                )
+        checkpointer = Checkpointer(
+            checkpoint_dir(output_dir), checkpoint_interval, [], state, dedup
+        )
 
-        all_credentials = []
-        failed_files = []
-        for result in results:
-            if result["status"] == "success":
-                all_credentials.extend(result["credentials"])
-            else:
-                failed_files.append(result)
+    progress: AnyProgress = (
+        EventProgress(input_path)
+        if getattr(args, "events", None) == "jsonl"
+        else ThrottledProgress(console, input_path)
+    )
 
-        total_credentials = len(all_credentials)
+    with progress, tempfile.TemporaryDirectory(prefix="dumper-", dir=temp_dir) as spill_dir:
+        # --- Parsing files and deduplicating as batches arrive --- #
+        file_task = progress.add_task(
+            "[magenta]Processing files...", total=0, stage="parse", unit="bytes"
+        )
+        sort_task = progress.add_task(
+            "[magenta]Sorting and deduplicating...", total=0, stage="dedup"
+        )
 
-        # --- Sorting and deduplicating --- #
-        sort_task = progress.add_task("[magenta]Sorting and deduplicating...", total=total_credentials)
+        batch_queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_depth)
+        dedup_task = asyncio.create_task(
+            dedup_batches(
+                batch_queue,
+                progress,
+                sort_task,
+                Path(spill_dir) if external_sort else None,
+                max_memory,
+                checkpointer,
+                metrics,
+                (shard[0] - 1, shard[1]) if shard and partition == "emails" else None,
+                key,
+                sort_output,
+                unit_groups,
+            )
+        )
+        parse_start = time.perf_counter()
+        results = await parse_files(
+            iter_in_thread(metrics.timed("walk", iter(units))),
+            batch_queue,
+            args,
+            progress,
+            file_task,
+            checkpointer,
+        )
+        metrics.add(
+            "walk", records=len({result.get("source", result["file_path"]) for result in results})
+        )
+        metrics.finish_stage("walk")
+        metrics.add(
+            "parse",
+            time.perf_counter() - parse_start,
+            sum(result.get("cpu_time", 0.0) for result in results),
+            sum(result["total_lines"] for result in results),
+            sum(result["file_size"] for result in results),
+        )
+        metrics.record_files(results)
+        metrics.finish_stage("parse", children=True)
+        await batch_queue.put(None)
+        entries, in_memory_credentials, runs, total_credentials = await dedup_task
 
-        start_time = time.time()
-        unique_credentials = []
-        seen = set()
-        for i, cred in enumerate(sorted(all_credentials, key=lambda x: x[0].lower())):
-            email, password = cred
-            if email.lower() not in seen:
-                seen.add(email.lower())
-                unique_credentials.append((email, password))            
-            progress.update(sort_task, advance=1)
-        progress.update(sort_task, completed=total_credentials)
+        failed_files = [result for result in results if result["status"] != "success"]
 
         # --- Writing output --- #
-        output_dir = output_path / f"{input_path.name}___output"
-        input_name = input_path.name  # Just the name of the subdirectory (e.g. creddump/folder1 -> folder1)
-        write_task = progress.add_task("[magenta]Writing output...", total=len(unique_credentials))
-        await write_output(output_dir, input_name, unique_credentials, split_size, progress, write_task)
+        if manifest is not None and previous_outputs:
+            total_credentials += manifest["output_records"]
+        # With spilled runs the unique count is only known after merging, total_credentials is the
+        # upper bound
+        write_task = progress.add_task(
+            "[magenta]Writing output...",
+            total=total_credentials if runs else in_memory_credentials,
+            stage="write",
+        )
+
+        # An email index of an email-normalized run remembers the normalized emails, as dedup
+        # compares them
+        index_mode = "pair" if index_key == "pair" else dedup_mode
+        indexed_by = dedup_key(index_mode, providers)
+        index = (
+            open_index(Path(index_path), dedup_name(index_mode, providers)) if index_path else None
+        )
+        unique_credentials = 0
+        try:
+            write_queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_depth)
+            # A node of a sharded run writes a partial output that keeps the ranks, for dumper merge
+            output_name, columns = (
+                (partial_name(input_name, shard), partial_columns(dedup))
+                if shard
+                else (input_name, OUTPUT_COLUMNS)
+            )
+            writer = asyncio.create_task(
+                write_output(
+                    output_dir,
+                    output_name,
+                    queue_batches(write_queue),
+                    split_size,
+                    progress,
+                    write_task,
+                    compression,
+                    shard_by,
+                    shards,
+                    metrics,
+                    columns,
+                )
+            )
+            previous = read_output(previous_outputs, key) if previous_outputs else None
+            # Merging the sorted entries is dedup work, the rest of the loop is the writer's
+            write_start, merge_time = time.perf_counter(), metrics.stages["dedup"]["wall_time"]
+            for batch in metrics.timed(
+                "dedup",
+                iter_unique_batches(
+                    entries, runs, batch_size, previous, with_rank=bool(shard), key=key
+                ),
+            ):
+                unique_credentials += len(batch)
+                if index is not None:
+                    batch = filter_new(index, batch, indexed_by)
+                await put_batch(write_queue, batch, writer)
+            await put_batch(write_queue, None, writer)
+            new_credentials, output_files = await writer
+            metrics.finish_stage("dedup")
+            metrics.add(
+                "write",
+                time.perf_counter()
+                - write_start
+                - (metrics.stages["dedup"]["wall_time"] - merge_time),
+            )
+        except BaseException:
+            if index is not None:
+                close_index(index, commit=False)
+            raise
+        if index is not None:
+            close_index(index)
+        progress.update(write_task, total=new_credentials, completed=new_credentials)
 
+        # --- Indexing output for lookups --- #
+        if lookup_index:
+            index_start = time.perf_counter()
+            await asyncio.gather(
+                *[
+                    loop.run_in_executor(None, write_lookup_index, output_file, shard_by, shards)
+                    for output_file in output_files
+                ]
+            )
+            metrics.add("write", time.perf_counter() - index_start)
+        metrics.finish_stage("write")
+
+    if manifest is not None:
+        await update_manifest(
+            manifest,
+            output_dir,
+            input_path,
+            results,
+            output_files,
+            new_credentials,
+            dedup,
+            known_files,
+        )
+    if checkpointer:
+        checkpointer.clear()
+
+    metrics.totals = {
+        "files": len(results),
+        "failed_files": len(failed_files),
+        "skipped_files": len(skipped_files),
+        "total_credentials": total_credentials,
+        "unique_credentials": unique_credentials,
+        "new_credentials": new_credentials if index_path else None,
+    }
     return {
         "total_files": len(results),
-        "total_credentials": len(all_credentials),
-        "unique_credentials": len(unique_credentials),
+        "skipped_files": len(skipped_files),
+        "total_credentials": total_credentials,
+        "unique_credentials": unique_credentials,
+        "new_credentials": new_credentials if index_path else None,
         "failed_files": failed_files,
-        "results": results
+        "results": results,
+        "metrics": metrics,
     }
@@ -0,0 +1,212 @@
+import csv
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+DELIMITERS = (",", ";", ":", "\t", "|")
+
+# Line prefixes that mark a comment; '#' lines are always skipped
+COMMENT_PREFIXES = ("#", "//", ";", "--")
+
+# Header names of the email and password columns, the most telling first
+EMAIL_HEADERS = (
+    "email",
+    "e-mail",
+    "mail",
+    "email_address",
+    "emailaddress",
+    "login",
+    "username",
+    "user",
+)
+PASSWORD_HEADERS = ("password", "pass", "passwd", "pwd", "pw", "plaintext")
+
+# Number of lines a profile is sniffed from
+PROFILE_SAMPLE_LINES = 100
+
+# An email with no delimiter, quote or whitespace in it, so a field holding one was split right
+SNIFF_EMAIL_PATTERN = re.compile(r"[^@\s\"',;:|]+@[^@\s\"',;:|]+\.[^@\s\"',;:|.]+")
+
+
+class Profile(NamedTuple):
+    """How the lines of a file are laid out, sniffed from a sample of them (see sniff_profile)."""
+
+    delimiter: str = ","
+    email_column: int = 0
+    password_column: int = 1
+    quoted: bool = False
+    comment: str = "#"
+    header: bool = False
+
+
+def detect_delimiter(sample_lines: List[str]) -> str:
+    delimiters = [",", ";", ":", "\t"]
+    delimiter_counts = {d: 0 for d in delimiters}
+
+    for line in sample_lines:
+        for d in delimiters:
+            if d in line:
+                delimiter_counts[d] += 1
+
+    most_common_delimiter = max(delimiter_counts, key=delimiter_counts.__getitem__)
+    return most_common_delimiter if delimiter_counts[most_common_delimiter] > 0 else ","
+
+
+def sniff_profile(sample_lines: Iterable[str]) -> Profile:
+    """Work out the delimiter, email and password columns, quoting, comments and header of a file.
+
+    The delimiter and email column are the ones that split the most sample lines into a field
+    holding a clean email. If no delimiter does, it falls back to detect_delimiter and the
+    email,password layout.
+    """
+    data: List[str] = []
+    comments: List[str] = []
+    for line in sample_lines:
+        line = line.strip()
+        if line:
+            (comments if line.startswith(COMMENT_PREFIXES) else data).append(line)
+
+    best: Tuple[int, int, str, int] = (0, 0, ",", 0)
+    for delimiter in DELIMITERS:
+        counts = column_email_counts(data, delimiter)
+        if counts:
+            column = max(counts, key=lambda column: (counts[column], -column))
+            present = sum(delimiter in line for line in data)
+            # The first delimiter wins ties, as with detect_delimiter
+            if (counts[column], present) > best[:2]:
+                best = (counts[column], present, delimiter, column)
+    emails, _, delimiter, email_column = best
+
+    if not emails:
+        delimiter = detect_delimiter(data)
+    comment = max(
+        COMMENT_PREFIXES,
+        key=lambda prefix: (
+            prefix != delimiter and sum(line.startswith(prefix) for line in comments),
+            prefix == "#",
+        ),
+    )
+
+    header = False
+    password_column = None
+    names = [field.strip().lower() for field in split_fields(data[0], delimiter)] if data else []
+    if names and not any(SNIFF_EMAIL_PATTERN.fullmatch(name) for name in names):
+        email_names = [name for name in EMAIL_HEADERS if name in names]
+        password_names = [name for name in PASSWORD_HEADERS if name in names]
+        if email_names:
+            header = True
+            email_column = email_column if emails else names.index(email_names[0])
+            password_column = names.index(password_names[0]) if password_names else None
+            data = data[1:]
+
+    if not emails and not header:
+        email_column = 0
+    if password_column is None:
+        password_column = guess_password_column(data, delimiter, email_column)
+
+    return Profile(
+        delimiter=delimiter,
+        email_column=email_column,
+        password_column=password_column,
+        quoted=sum('"' in line for line in data) * 2 >= len(data) > 0,
+        comment=comment,
+        header=header,
+    )
+
+
+def guess_password_column(data: List[str], delimiter: str, email_column: int) -> int:
+    # The column after the email, or before it if the email usually comes last
+    followed = sum(len(split_fields(line, delimiter)) > email_column + 1 for line in data)
+    return email_column - 1 if email_column > 0 and followed * 2 < len(data) else email_column + 1
+
+
+def column_email_counts(lines: List[str], delimiter: str) -> Counter[int]:
+    """Count the lines holding a clean email, by the column it is in."""
+    counts: Counter[int] = Counter()
+    for line in lines:
+        if delimiter not in line:
+            continue
+        for column, field in enumerate(split_fields(line, delimiter)):
+            if SNIFF_EMAIL_PATTERN.fullmatch(field.strip()):
+                counts[column] += 1
+                break
+    return counts
+
+
+def split_fields(line: str, delimiter: str) -> List[str]:
+    if '"' not in line:
+        return line.split(delimiter)
+    try:
+        return next(csv.reader([line], delimiter=delimiter, quotechar='"'), [])
+    except csv.Error:
+        return line.split(delimiter)
+
+
+def profile_fits(profile: Profile, sample_lines: Iterable[str]) -> bool:
+    """Whether a profile sniffed from another file finds clean emails in most of these lines."""
+    data = data_lines(sample_lines, profile.comment)
+    if data and is_header(data[0], profile.delimiter):
+        data = data[1:]
+    emails = 0
+    for line in data:
+        fields = split_fields(line, profile.delimiter)
+        if len(fields) > profile.email_column and SNIFF_EMAIL_PATTERN.fullmatch(
+            fields[profile.email_column].strip()
+        ):
+            emails += 1
+    return emails * 2 >= len(data)
+
+
+def data_lines(sample_lines: Iterable[str], comment: str) -> List[str]:
+    """The stripped lines that are neither blank nor comments."""
+    lines = [line.strip() for line in sample_lines]
+    return [line for line in lines if line and not line.startswith(("#", comment))]
+
+
+def is_header(line: str, delimiter: str) -> bool:
+    """Whether a line is a header row: no clean email, but a column named like one."""
+    names = [field.strip().lower() for field in split_fields(line, delimiter)]
+    return not any(SNIFF_EMAIL_PATTERN.fullmatch(name) for name in names) and any(
+        name in EMAIL_HEADERS for name in names
+    )
+
+
+def resolve_profile(sample_lines: List[str], profile: Optional[Profile] = None) -> Profile:
+    """The given profile if it fits the sample, else one sniffed from the sample.
+
+    Whether a file starts with a header is its own, so a given profile gets it from the sample.
+    """
+    if profile is not None and profile_fits(profile, sample_lines):
+        data = data_lines(sample_lines, profile.comment)
+        return profile._replace(header=bool(data) and is_header(data[0], profile.delimiter))
+    return sniff_profile(sample_lines)
+
+
+def profile_key(file_path: Path) -> Optional[Tuple[str, str]]:
+    """Files sharing a directory and a name up to its numbers (dump_001.txt, dump_002.txt) share
+    a profile. None for names without numbers, which have no siblings to share one with.
+    """
+    pattern = re.sub(r"\d+", "#", file_path.name)
+    return (str(file_path.parent), pattern) if pattern != file_path.name else None
+
+
+class ProfileCache:
+    """Profiles by profile_key, kept from the first of the similar files sniffed."""
+
+    def __init__(self) -> None:
+        self.profiles: Dict[Tuple[str, str], Profile] = {}
+
+    def get(self, file_path: Union[str, Path]) -> Optional[Profile]:
+        key = profile_key(Path(file_path))
+        return self.profiles.get(key) if key else None
+
+    def add(self, file_path: Union[str, Path], profile: Optional[Profile]) -> None:
+        key = profile_key(Path(file_path))
+        if key and key not in self.profiles and profile is not None:
+            self.profiles[key] = profile
+
+    def shares(self, file_path: Union[str, Path]) -> bool:
+        """Whether a profile for file_path would be kept for similar files."""
+        key = profile_key(Path(file_path))
+        return key is not None and key not in self.profiles
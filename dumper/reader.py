@@ -0,0 +1,121 @@
+import codecs
+import io
+import mmap
+from typing import IO, Any, Iterator, Optional, Tuple
+
+# Bytes inspected to guess a file's encoding
+SNIFF_SIZE = 4096
+
+# Bytes read from a memory-mapped file at once, extended to the next line break
+BLOCK_SIZE = 4 << 20
+
+# Checked longest first, the UTF-32 LE BOM starts with the UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Codecs whose line breaks and delimiters are plain ASCII bytes, so lines can be split undecoded
+ASCII_COMPATIBLE = {"utf-8", "latin-1"}
+
+
+def sniff_encoding(sample: bytes) -> Tuple[str, int]:
+    """Guess the encoding of a file from its first block, returning (codec, BOM length).
+
+    A BOM decides outright. Without one, NUL bytes concentrated on odd or even positions point to
+    UTF-16; otherwise the sample is UTF-8 if it decodes as such and Latin-1 if it does not.
+    """
+    for bom, codec in BOMS:
+        if sample.startswith(bom):
+            # utf-8 skips its BOM by offset, the UTF-16/32 codecs need theirs to pick the byte order
+            return codec, len(bom) if codec == "utf-8" else 0
+
+    pairs = len(sample) // 2
+    if pairs:
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        if odd_nuls > pairs * 0.3 and even_nuls < pairs * 0.05:
+            return "utf-16-le", 0
+        if even_nuls > pairs * 0.3 and odd_nuls < pairs * 0.05:
+            return "utf-16-be", 0
+
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "latin-1", 0
+    return "utf-8", 0
+
+
+def iter_blocks(
+    mm: mmap.mmap, start: int = 0, end: Optional[int] = None, block_size: int = BLOCK_SIZE
+) -> Iterator[bytes]:
+    """Yield blocks of mm[start:end] that each end on a line break (or at end)."""
+    end = len(mm) if end is None else end
+    while start < end:
+        stop = min(start + block_size, end)
+        if stop < end:
+            # Cut after the last line break in the block, or the next one if the block has none
+            cut = max(mm.rfind(b"\n", start, stop), mm.rfind(b"\r", start, stop))
+            if cut == -1:
+                cut = find_line_break(mm, stop, end)
+            stop = end if cut == -1 else cut + 1
+        yield mm[start:stop]
+        start = stop
+
+
+def find_line_break(mm: mmap.mmap, start: int, end: int) -> int:
+    cut = mm.find(b"\n", start, end)
+    cut_r = mm.find(b"\r", start, end)
+    return cut_r if cut == -1 or (cut_r != -1 and cut_r < cut) else cut
+
+
+def align_to_line(mm: mmap.mmap, position: int, start: int = 0) -> int:
+    """Move position forward to the start of the next line, unless a line already starts there.
+
+    Aligning both ends of consecutive byte ranges this way hands every line to exactly one range:
+    the one its first byte falls in.
+    """
+    if position <= start:
+        return start
+    if position >= len(mm) or mm[position - 1] in b"\n\r":
+        return min(position, len(mm))
+    cut = find_line_break(mm, position, len(mm))
+    return len(mm) if cut == -1 else cut + 1
+
+
+def iter_stream_blocks(
+    stream: IO[bytes], head: bytes = b"", block_size: int = BLOCK_SIZE
+) -> Iterator[bytes]:
+    """Yield blocks of head plus the rest of a binary stream, each ending on a line break.
+
+    The last block ends where the stream does.
+    """
+    pending = head
+    while data := stream.read(block_size):
+        pending += data
+        cut = max(pending.rfind(b"\n"), pending.rfind(b"\r"))
+        if cut != -1:
+            yield pending[: cut + 1]
+            pending = pending[cut + 1 :]
+    if pending:
+        yield pending
+
+
+class PrefixedReader(io.RawIOBase):
+    """A raw binary stream of prefix followed by the rest of stream, to put back sniffed bytes."""
+
+    def __init__(self, prefix: bytes, stream: IO[bytes]) -> None:
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.prefix[: len(buffer)] if self.prefix else self.stream.read(len(buffer))
+        self.prefix = self.prefix[len(data) :]
+        buffer[: len(data)] = data
+        return len(data)
@@ -1,18 +1,43 @@
+import json
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import IO, Any, Dict, List, Optional, Union
 
 import humanize
 from rich.console import Console
 from rich.panel import Panel
+from rich.progress import (
+    BarColumn,
+    Progress,
+    ProgressColumn,
+    SpinnerColumn,
+    Task,
+    TaskID,
+    TextColumn,
+    TimeRemainingColumn,
+)
 from rich.table import Table
+from rich.text import Text
+
+# Seconds between updates of the progress bars and flushes of the file log
+REFRESH_INTERVAL = 0.1
+
+# Seconds between progress events in --events mode
+EVENT_INTERVAL = 1.0
+
+# File log lines printed to a terminal per refresh; the rest are summed up in one line
+MAX_LOG_LINES = 20
 
 
 def create_file_console(file_path: Path) -> Console:
     return Console(file=open(file_path, "w"), color_system=None)
 
+
 def indent_text(text: str, indent: int = 2) -> str:
     return "\n".join(" " * indent + line for line in text.split("\n"))
 
+
 def display_header(console: Console, args: Any) -> None:
     header = f"""
 [bold magenta]d u m p e r[/bold magenta]
@@ -20,49 +45,67 @@ def display_header(console: Console, args: Any) -> None:
 [white]{'Output':<15}[/white] [bright_cyan]{str(args.output)}[/bright_cyan]
 [white]{'File Extension':<15}[/white] [bright_cyan]{args.ext or 'All files'}[/bright_cyan]
 [white]{'Split Size':<15}[/white] [bright_cyan]{humanize.intcomma(args.split) if args.split else 'N/A'}[/bright_cyan]
+[white]{'Workers':<15}[/white] [bright_cyan]{args.workers}[/bright_cyan]
 """
     console.print(indent_text(header))
 
+
 def display_results(console: Console, results: Dict[str, Any]) -> None:
-    dedup_rate = (1 - results['unique_credentials'] / results['total_credentials']) * 100
-    failed_files_count = len(results['failed_files'])
+    dedup_rate = (
+        (1 - results["unique_credentials"] / results["total_credentials"]) * 100
+        if results["total_credentials"]
+        else 0.0
+    )
+    failed_files_count = len(results["failed_files"])
+    skipped_line = (
+        f"[white]{'Skipped (Unchanged)':<25}[/white] "
+        f"[bright_cyan]{humanize.intcomma(results['skipped_files'])}[/bright_cyan]\n"
+        if results.get("skipped_files")
+        else ""
+    )
     results_text = f"""
 [bold magenta]Processing Results[/bold magenta]
 [white]{'Total Files Processed':<25}[/white] [bright_cyan]{humanize.intcomma(results['total_files'])}[/bright_cyan]
-[white]{'Failed Files':<25}[/white] [bright_cyan]{humanize.intcomma(failed_files_count)}[/bright_cyan]
+{skipped_line}[white]{'Failed Files':<25}[/white] [bright_cyan]{humanize.intcomma(failed_files_count)}[/bright_cyan]
 [white]{'Total Credentials Found':<25}[/white] [bright_cyan]{humanize.intcomma(results['total_credentials'])}[/bright_cyan]
 [white]{'Unique Credentials':<25}[/white] [bright_cyan]{humanize.intcomma(results['unique_credentials'])}[/bright_cyan]
 [white]{'Deduplication Rate':<25}[/white] [bright_cyan]{dedup_rate:.2f}%[/bright_cyan]
 """
+    if results.get("new_credentials") is not None:
+        previously_seen = results["unique_credentials"] - results["new_credentials"]
+        results_text += (
+            f"[white]{'New Credentials':<25}[/white] "
+            f"[bright_cyan]{humanize.intcomma(results['new_credentials'])}[/bright_cyan]\n"
+            f"[white]{'Previously Seen':<25}[/white] "
+            f"[bright_cyan]{humanize.intcomma(previously_seen)}[/bright_cyan]\n"
+        )
     console.print(indent_text(results_text))
 
     if failed_files_count > 0:
-        display_failed_files(console, results['failed_files'])
+        display_failed_files(console, results["failed_files"])
+
 
 def display_failed_files(console: Console, failed_files: List[Dict[str, Any]]) -> None:
     console.print("\n[bold red]Failed Files:[/bold red]")
-    
+
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("File Path", style="cyan", width=50)
     table.add_column("Error", style="red", width=30)
     table.add_column("Sample", style="yellow")
 
     for file in failed_files:
-        table.add_row(
-            str(file['file_path']),
-            file['error'],
-            file['sample'].replace('\n', '\\n')
-        )
+        table.add_row(str(file["file_path"]), file["error"], file["sample"].replace("\n", "\\n"))
 
     console.print(table)
 
-def log_processed_file(console: Console, file_result: Dict[str, Any], input_path: Path) -> None:
-    file_path = Path(file_result['file_path'])
+
+def format_processed_file(file_result: Dict[str, Any], input_path: Path) -> str:
+    file_path = Path(file_result["file_path"])
     relative_path = str(file_path.relative_to(input_path))
     if len(relative_path) > 50:
         relative_path = relative_path[:47] + "..."
-    file_size = humanize.naturalsize(file_result['file_size'])
-    total_lines = humanize.intcomma(file_result['total_lines'])
+    file_size = humanize.naturalsize(file_result["file_size"])
+    total_lines = humanize.intcomma(file_result["total_lines"])
     time_taken = f"{file_result['time_taken']:.2f}s"
 
     log_text = (
@@ -71,4 +114,207 @@ def log_processed_file(console: Console, file_result: Dict[str, Any], input_path
         f"[green]{total_lines:>10} lines[/]"
         f"[yellow]{time_taken:>8}[/]"
     )
-    console.print(indent_text(log_text))
+    return indent_text(log_text)
+
+
+class CountColumn(ProgressColumn):
+    """Completed of total, as sizes for tasks added with unit="bytes"."""
+
+    def render(self, task: Task) -> Text:
+        if task.fields.get("unit") == "bytes":
+            return Text(
+                f"{humanize.naturalsize(task.completed):>10} of "
+                f"{humanize.naturalsize(task.total or 0):<10}",
+                style="cyan",
+            )
+        return Text(f"{task.completed:>10,.0f} of {task.total:<10,}", style="cyan")
+
+
+class ThrottledProgress:
+    """Stands in for a rich Progress, folding updates together and applying them (and printing
+    the logged files) at most every interval seconds, so per-batch updates cost next to nothing.
+    """
+
+    def __init__(
+        self, console: Console, input_path: Path, interval: float = REFRESH_INTERVAL
+    ) -> None:
+        self.console = console
+        self.input_path = input_path
+        self.interval = interval
+        self.progress = Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description:<30}"),
+            CountColumn(),
+            BarColumn(bar_width=23),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TimeRemainingColumn(),
+            console=console,
+        )
+        self.pending: Dict[TaskID, Dict[str, float]] = {}
+        self.logged: List[Dict[str, Any]] = []
+        self.next_flush = 0.0
+
+    def __enter__(self) -> "ThrottledProgress":
+        self.progress.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.flush()
+        self.progress.stop()
+
+    def add_task(self, description: str, total: Optional[float] = None, **fields: Any) -> TaskID:
+        self.flush()
+        return self.progress.add_task(description, total=total, **fields)
+
+    def update(
+        self,
+        task_id: TaskID,
+        total: Optional[float] = None,
+        completed: Optional[float] = None,
+        advance: Optional[float] = None,
+    ) -> None:
+        pending = self.pending.setdefault(task_id, {})
+        if total is not None:
+            pending["total"] = total
+        if completed is not None:
+            pending["completed"] = completed
+            pending.pop("advance", None)
+        if advance:
+            pending["advance"] = pending.get("advance", 0) + advance
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def advance(self, task_id: TaskID, advance: float = 1) -> None:
+        self.update(task_id, advance=advance)
+
+    def log_file(self, file_result: Dict[str, Any]) -> None:
+        self.logged.append(file_result)
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        for task_id, pending in self.pending.items():
+            if "total" in pending or "completed" in pending:
+                self.progress.update(
+                    task_id, total=pending.get("total"), completed=pending.get("completed")
+                )
+            if "advance" in pending:
+                self.progress.advance(task_id, pending["advance"])
+        self.pending = {}
+
+        if self.logged:
+            shown = self.logged[:MAX_LOG_LINES] if self.console.is_terminal else self.logged
+            lines = [format_processed_file(file_result, self.input_path) for file_result in shown]
+            if len(shown) < len(self.logged):
+                rest = self.logged[len(shown) :]
+                rest_lines = sum(file_result["total_lines"] for file_result in rest)
+                lines.append(
+                    indent_text(
+                        f"[white]... and {humanize.intcomma(len(rest))} more files, "
+                        f"{humanize.intcomma(rest_lines)} lines[/]"
+                    )
+                )
+            self.console.print("\n".join(lines))
+            self.logged = []
+        self.next_flush = time.monotonic() + self.interval
+
+
+class EventProgress:
+    """Stands in for ThrottledProgress in headless runs, writing JSON Lines events instead.
+
+    Every logged file is an event; progress events are written at most every interval seconds.
+    """
+
+    def __init__(
+        self,
+        input_path: Path,
+        stream: Optional[IO[str]] = None,
+        interval: float = EVENT_INTERVAL,
+    ) -> None:
+        self.input_path = input_path
+        # sys.stdout as it is now, it can be replaced after the module is imported
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.tasks: List[Dict[str, Any]] = []
+        self.changed: Dict[int, None] = {}
+        self.next_flush = 0.0
+
+    def __enter__(self) -> "EventProgress":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.flush()
+
+    def add_task(self, description: str, total: Optional[float] = None, **fields: Any) -> TaskID:
+        self.flush()
+        self.tasks.append(
+            {
+                "stage": fields.get("stage", description),
+                "completed": 0,
+                "total": total,
+                "unit": fields.get("unit", "records"),
+            }
+        )
+        return TaskID(len(self.tasks) - 1)
+
+    def update(
+        self,
+        task_id: TaskID,
+        total: Optional[float] = None,
+        completed: Optional[float] = None,
+        advance: Optional[float] = None,
+    ) -> None:
+        task = self.tasks[task_id]
+        if total is not None:
+            task["total"] = total
+        if completed is not None:
+            task["completed"] = completed
+        if advance:
+            task["completed"] += advance
+        self.changed[task_id] = None
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def advance(self, task_id: TaskID, advance: float = 1) -> None:
+        self.update(task_id, advance=advance)
+
+    def log_file(self, file_result: Dict[str, Any]) -> None:
+        write_event(self.stream, "file", **file_event(file_result, self.input_path))
+
+    def flush(self) -> None:
+        for task_id in self.changed:
+            task = self.tasks[task_id]
+            write_event(
+                self.stream,
+                "progress",
+                stage=task["stage"],
+                completed=round(task["completed"], 3),
+                total=task["total"],
+                unit=task["unit"],
+            )
+        self.changed = {}
+        self.stream.flush()
+        self.next_flush = time.monotonic() + self.interval
+
+
+# What the pipeline reports its progress to
+AnyProgress = Union[ThrottledProgress, EventProgress]
+
+
+def file_event(file_result: Dict[str, Any], input_path: Path) -> Dict[str, Any]:
+    event = {
+        "file_path": str(Path(file_result["file_path"]).relative_to(input_path)),
+        "status": file_result["status"],
+        "bytes": file_result["file_size"],
+        "records": file_result["total_lines"],
+        "seconds": round(file_result["time_taken"], 6),
+    }
+    if file_result["status"] != "success":
+        event["error"] = file_result["error"]
+    return event
+
+
+def write_event(stream: IO[str], event: str, **fields: Any) -> None:
+    stream.write(
+        json.dumps({"event": event, "time": round(time.time(), 3), **fields}, default=str) + "\n"
+    )
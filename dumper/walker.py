@@ -0,0 +1,79 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple, TypeVar
+
+from dumper import IGNORED_FILES
+from dumper.archive import is_wanted
+
+T = TypeVar("T")
+
+
+def walk_files(
+    input_path: Path, ext: Optional[str] = None
+) -> Iterator[Tuple[Path, os.stat_result]]:
+    """Yield the wanted files under input_path with their stat, as the walk finds them.
+
+    Uses os.scandir, so directories are told apart without a stat call and each file is stat'ed
+    once. Directories named in IGNORED_FILES are not entered, and neither are symlinked ones.
+    Files come in the order of Path.rglob: a directory's own files first, then its subdirectories
+    one by one. Directories that cannot be read are skipped.
+    """
+    if input_path.is_file():
+        yield input_path, input_path.stat()
+        return
+    if not input_path.is_dir():
+        return
+
+    directories: List[str] = [str(input_path)]
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as scanner:
+                entries = list(scanner)
+        except OSError:
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if entry.name in IGNORED_FILES:
+                continue
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirectories.append(entry.path)
+                    continue
+                file_path = Path(entry.path)
+                if is_wanted(file_path, ext):
+                    yield file_path, entry.stat()
+            except OSError:
+                continue  # vanished, or a broken symlink
+        # Popped from the end, so reversed to enter them in scandir order
+        directories.extend(reversed(subdirectories))
+
+
+async def iter_in_thread(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Run a blocking iterator on the default executor, yielding its items as they come.
+
+    The iterator runs ahead of the consumer. It is stopped at its next item if the consumer stops
+    early, and its error, if any, is raised once the items before it are consumed.
+    """
+    loop = asyncio.get_event_loop()
+    items: asyncio.Queue[Any] = asyncio.Queue()
+    stopped = threading.Event()
+
+    def run() -> None:
+        for item in iterator:
+            if stopped.is_set():
+                return
+            loop.call_soon_threadsafe(items.put_nowait, (item,))
+
+    future = loop.run_in_executor(None, run)
+    # Runs after the items the thread already handed over, so it always comes last
+    future.add_done_callback(lambda _: items.put_nowait(None))
+    try:
+        while (item := await items.get()) is not None:
+            yield item[0]
+        future.result()
+    finally:
+        stopped.set()
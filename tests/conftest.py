@@ -0,0 +1,64 @@
+import json
+import random
+
+import pytest
+
+from dumper.cli import main
+
+
+@pytest.fixture
+def credential_dir(tmp_path):
+    """A few files of credentials that overlap across files, emails in mixed case."""
+    rng = random.Random(0)
+    emails = [f"user{i}@example{i % 7}.com" for i in range(3000)]
+    input_dir = tmp_path / "dump"
+    input_dir.mkdir()
+    for file_number in range(6):
+        lines = []
+        for _ in range(2000):
+            email = rng.choice(emails)
+            if rng.random() < 0.3:
+                email = email.upper()
+            lines.append(f"{email}:pw{rng.randrange(3)}\n")
+        (input_dir / f"part{file_number}.txt").write_text("".join(lines))
+    return input_dir
+
+
+@pytest.fixture
+def run_dumper():
+    """Runs the dumper CLI without the UI and returns the lines of its output files."""
+
+    def run(input_dir, output, *args):
+        main([str(input_dir), "-o", str(output), "-n", "-w", "1", *map(str, args)])
+        return read_output(output)
+
+    return run
+
+
+@pytest.fixture
+def merge_dumper():
+    """Runs dumper merge on the partial outputs in a directory and returns the merged lines."""
+
+    def merge(partial_dir, output, *args):
+        main(["merge", str(partial_dir), "-o", str(output), *map(str, args)])
+        return read_output(output)
+
+    return merge
+
+
+@pytest.fixture
+def done_event(capsys):
+    """Returns the done event of the last run with --events jsonl, holding its counts."""
+
+    def read():
+        return json.loads(capsys.readouterr().out.splitlines()[-1])
+
+    return read
+
+
+def read_output(output):
+    return [
+        line
+        for path in sorted(output.glob("*___output/*.csv"))
+        for line in path.read_text().splitlines()
+    ]
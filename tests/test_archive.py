@@ -0,0 +1,58 @@
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+
+import pytest
+
+from dumper.walker import walk_files
+
+COMPRESSORS = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+# Bytes that hold no email, as an image or a document would
+JUNK = bytes(range(256)).replace(b"@", b"") * 64
+
+
+def pack(credential_dir, archive_dir, kind):
+    """Return an archive of kind made from credential_dir and the plain input it holds.
+
+    Members go in the order the walk finds the files, so the first credential of each email is
+    the same. A compressed file only holds the first file.
+    """
+    archive_dir.mkdir()
+    files = [file_path for file_path, _ in walk_files(credential_dir)]
+    if kind in COMPRESSORS:
+        with COMPRESSORS[kind](archive_dir / f"{files[0].name}.{kind}", "wb") as f:
+            f.write(files[0].read_bytes())
+        return archive_dir / f"{files[0].name}.{kind}", files[0]
+    if kind == "zip":
+        with zipfile.ZipFile(archive_dir / "dump.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+            for file_path in files:
+                archive.write(file_path, f"dump/{file_path.name}")
+        return archive_dir / "dump.zip", credential_dir
+    with tarfile.open(archive_dir / "dump.tar", "w") as archive:
+        for file_path in files:
+            archive.add(file_path, f"dump/{file_path.name}")
+    return archive_dir / "dump.tar", credential_dir
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("kind", ["gz", "bz2", "xz", "zip", "tar"])
+def test_archives_match_plain_files(credential_dir, run_dumper, tmp_path, kind, workers):
+    archive_path, plain = pack(credential_dir, tmp_path / "archives", kind)
+    output = run_dumper(archive_path, tmp_path / "out", "-w", workers)
+    assert len(output) > 1000
+    assert output == run_dumper(plain, tmp_path / "plain")
+
+
+@pytest.mark.parametrize("ext", [None, "txt"])
+def test_zip_members_without_credentials(credential_dir, run_dumper, tmp_path, ext):
+    archive_path, plain = pack(credential_dir, tmp_path / "archives", "zip")
+    with zipfile.ZipFile(archive_path, "a") as archive:
+        archive.writestr("dump/photo.jpg", JUNK)
+        archive.writestr("__MACOSX/dump/.DS_Store", JUNK)
+    args = ("-e", ext) if ext else ()
+    assert run_dumper(archive_path, tmp_path / "out", *args) == run_dumper(
+        plain, tmp_path / "plain"
+    )
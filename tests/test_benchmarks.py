@@ -0,0 +1,16 @@
+import json
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.run import main
+
+
+def test_benchmark_stages_count_the_corpus(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    corpus = generate_corpus(corpus_dir, 64 * 1024, 3, duplicates=0.3)
+    results_path = tmp_path / "results.json"
+    main([str(corpus_dir), "--output", str(results_path)])
+
+    stages = json.loads(results_path.read_text())["stages"]
+    assert stages["parse_file"]["records"] == corpus["records"]
+    assert 0 < stages["dedup"]["unique"] < stages["dedup"]["records"]
+    assert stages["write"]["records"] == stages["dedup"]["unique"]
@@ -0,0 +1,46 @@
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Runs the CLI with a checkpoint due after every batch, and kills it right after the third one
+KILLED_RUN = """
+import os, signal, sys
+from dumper.checkpoint import Checkpointer
+from dumper.cli import main
+
+save = Checkpointer.save
+
+def save_and_kill(self, *args):
+    save(self, *args)
+    self.saves = getattr(self, "saves", 0) + 1
+    if self.saves == 3:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+Checkpointer.save = save_and_kill
+Checkpointer.due = lambda self: True
+main(sys.argv[1:])
+"""
+
+
+@pytest.mark.parametrize("dedup", ["email", "pair"])
+def test_resume_matches_uninterrupted_run(credential_dir, run_dumper, tmp_path, dedup):
+    uninterrupted = run_dumper(credential_dir, tmp_path / "uninterrupted", "--dedup", dedup)
+
+    output = tmp_path / "killed"
+    args = [str(credential_dir), "-o", str(output), "-n", "-w", "1", "-b", "500", "--dedup", dedup]
+    repo = Path(__file__).parent.parent
+    killed = subprocess.run(
+        [sys.executable, "-c", KILLED_RUN, *args],
+        cwd=repo,
+        env={**os.environ, "PYTHONPATH": str(repo)},
+    )
+    assert killed.returncode == -signal.SIGKILL
+    assert (output / f"{credential_dir.name}___output" / ".checkpoint" / "state.json").exists()
+
+    resumed = run_dumper(credential_dir, output, "-b", "500", "--dedup", dedup, "--resume")
+    assert resumed == uninterrupted
+    assert not (output / f"{credential_dir.name}___output" / ".checkpoint").exists()
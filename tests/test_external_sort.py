@@ -0,0 +1,28 @@
+import pytest
+
+import dumper.dedup
+
+
+@pytest.mark.parametrize("dedup", ["email", "pair"])
+def test_external_sort_matches_in_memory(credential_dir, run_dumper, tmp_path, dedup):
+    in_memory = run_dumper(credential_dir, tmp_path / "memory", "--dedup", dedup)
+    # A few hundred entries per spilled run, so the merge has several runs to go through
+    external = run_dumper(
+        credential_dir, tmp_path / "external", "--dedup", dedup, "-x", "-m", "64K", "-b", "500"
+    )
+    assert len(in_memory) > 1000
+    assert external == in_memory
+
+
+def test_max_memory_alone_spills(credential_dir, run_dumper, tmp_path, monkeypatch):
+    in_memory = run_dumper(credential_dir, tmp_path / "memory")
+    runs = []
+    write_run = dumper.dedup.write_run
+    monkeypatch.setattr(
+        dumper.dedup,
+        "write_run",
+        lambda path, entries: (runs.append(path), write_run(path, entries)),
+    )
+    bounded = run_dumper(credential_dir, tmp_path / "bounded", "-m", "64K", "-b", "500")
+    assert len(runs) > 1
+    assert bounded == in_memory
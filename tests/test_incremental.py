@@ -0,0 +1,42 @@
+import hashlib
+from pathlib import Path
+
+
+def test_rerun_only_hashes_changed_files(credential_dir, run_dumper, tmp_path, monkeypatch):
+    run_dumper(credential_dir, tmp_path / "out", "-r")
+    with open(credential_dir / "part0.txt", "a") as f:
+        f.write("changed@example.com:pw\n")
+
+    hashed = []
+    file_digest = hashlib.file_digest
+    monkeypatch.setattr(
+        hashlib,
+        "file_digest",
+        lambda f, digest: hashed.append(Path(f.name).name) or file_digest(f, digest),
+    )
+    rerun = run_dumper(credential_dir, tmp_path / "out", "-r")
+
+    assert hashed == ["part0.txt"]
+    assert rerun == run_dumper(credential_dir, tmp_path / "full")
+
+
+def test_rerun_skips_unchanged_files(credential_dir, run_dumper, tmp_path, done_event):
+    args = ("-r", "--events", "jsonl")
+    run_dumper(credential_dir, tmp_path / "out", *args)
+    first = done_event()
+
+    added = credential_dir / "part6.txt"
+    added.write_text("new1@example.com:pw\nnew2@example.com:pw\n")
+    output = run_dumper(credential_dir, tmp_path / "out", *args)
+    second = done_event()
+    assert (second["total_files"], second["skipped_files"]) == (1, 6)
+    assert second["unique_credentials"] == first["unique_credentials"] + 2
+    assert output == run_dumper(credential_dir, tmp_path / "full")
+
+    # A modified file means parsing everything again
+    with open(added, "a") as f:
+        f.write("new3@example.com:pw\n")
+    output = run_dumper(credential_dir, tmp_path / "out", *args)
+    third = done_event()
+    assert (third["total_files"], third["skipped_files"]) == (7, 0)
+    assert output == run_dumper(credential_dir, tmp_path / "full")
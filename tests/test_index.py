@@ -0,0 +1,53 @@
+import pytest
+
+
+def test_rerun_counts_credentials_new_to_the_index(
+    credential_dir, run_dumper, tmp_path, done_event
+):
+    args = ("-i", tmp_path / "seen.db", "--events", "jsonl")
+    run_dumper(credential_dir, tmp_path / "out", *args)
+    first = done_event()
+    assert first["new_credentials"] == first["unique_credentials"]
+
+    # One email the index has seen, with another password, and two it has not
+    seen_email = (credential_dir / "part0.txt").read_text().split(":")[0]
+    with open(credential_dir / "part5.txt", "a") as f:
+        f.write(f"{seen_email.lower()}:new\nnew1@example.com:pw\nnew2@example.com:pw\n")
+    run_dumper(credential_dir, tmp_path / "out", *args)
+    second = done_event()
+    assert second["unique_credentials"] == first["unique_credentials"] + 2
+    assert second["new_credentials"] == 2
+
+
+def test_normalized_index_knows_normalized_duplicates(tmp_path, run_dumper, done_event):
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    (first / "dump.txt").write_text("j.doe+news@gmail.com:pw\nsomeone@example.com:pw\n")
+    (second / "dump.txt").write_text(
+        "JDoe@gmail.com:other\njdoe@googlemail.com:pw\nsomeone+news@example.com:pw\n"
+    )
+    args = ("--dedup", "email-normalized", "-i", tmp_path / "seen.db", "--events", "jsonl")
+    run_dumper(first, tmp_path / "first_out", *args)
+    assert done_event()["new_credentials"] == 2
+
+    output = run_dumper(second, tmp_path / "second_out", *args)
+    assert done_event()["new_credentials"] == 2
+    assert output == [
+        '"email","password"',
+        '"jdoe@googlemail.com","pw"',
+        '"someone+news@example.com","pw"',
+    ]
+
+
+def test_index_refuses_another_key(credential_dir, run_dumper, tmp_path):
+    run_dumper(credential_dir, tmp_path / "out", "-i", tmp_path / "seen.db")
+    with pytest.raises(ValueError, match="keyed by email, not email-normalized"):
+        run_dumper(
+            credential_dir,
+            tmp_path / "out",
+            "-i",
+            tmp_path / "seen.db",
+            "--dedup",
+            "email-normalized",
+        )
@@ -0,0 +1,26 @@
+import pytest
+
+from dumper.keys import dedup_key
+
+GMAIL = dedup_key("email-normalized")
+
+
+@pytest.mark.parametrize(
+    "email,key",
+    [
+        ("J.Doe+news@Gmail.com", "jdoe@gmail.com"),
+        ("j.d.o.e+a+b@googlemail.com", "jdoe@googlemail.com"),
+        ("jdoe@gmail.com", "jdoe@gmail.com"),
+        # Other domains only fold case
+        ("J.Doe+news@Example.com", "j.doe+news@example.com"),
+        ("j.doe+news@gmail.com.example.com", "j.doe+news@gmail.com.example.com"),
+    ],
+)
+def test_default_providers(email, key):
+    assert GMAIL(email, "pw") == key
+
+
+def test_custom_providers_ignore_tags_not_dots():
+    outlook = dedup_key("email-normalized", ["Outlook.com"])
+    assert outlook("J.Doe+news@outlook.com", "pw") == "j.doe@outlook.com"
+    assert outlook("J.Doe+news@gmail.com", "pw") == "j.doe+news@gmail.com"
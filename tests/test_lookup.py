@@ -0,0 +1,62 @@
+import csv
+
+import pytest
+
+from dumper.lookup import LookupIndex, lookup, open_lookup_indexes
+
+# Emails sharing all 16 bytes of key prefix an index entry keeps, over several 4 KiB blocks
+COLLIDING = [f"prefixcollision+{i:05d}@example.com" for i in range(0, 2000, 2)]
+
+MISSING = [
+    "a@example.com",  # before the first email
+    "zzz@example.com",  # after the last one
+    "user1@example.com",
+    "prefixcollision+00001@example.com",
+    "prefixcollision@example.com",
+]
+
+
+@pytest.fixture
+def output_file(credential_dir, run_dumper, tmp_path):
+    (credential_dir / "colliding.txt").write_text("".join(f"{email}:pw\n" for email in COLLIDING))
+    run_dumper(credential_dir, tmp_path / "out", "-l")
+    (output_file,) = tmp_path.glob("out/*___output/*.csv")
+    return output_file
+
+
+def read_records(output_file):
+    with open(output_file, newline="") as f:
+        return {email.lower(): (email, password) for email, password in list(csv.reader(f))[1:]}
+
+
+def lookup_all(output_file, emails):
+    indexes = open_lookup_indexes(output_file.parent)
+    try:
+        return [lookup(indexes, email) for email in emails]
+    finally:
+        for index in indexes:
+            index.close()
+
+
+def test_lookup_finds_every_email(output_file):
+    records = read_records(output_file)
+    assert len(records) > 3000 and all(email in records for email in COLLIDING)
+    assert lookup_all(output_file, [email.upper() for email in records]) == [
+        [record] for record in records.values()
+    ]
+
+
+def test_lookup_misses(output_file):
+    assert lookup_all(output_file, MISSING) == [[] for _ in MISSING]
+
+
+def test_stale_index_is_rebuilt(output_file):
+    lines = output_file.read_bytes().splitlines(keepends=True)
+    output_file.write_bytes(b"".join(lines[:1] + lines[len(lines) // 2 :]))
+    records = read_records(output_file)
+    dropped = [line.decode().split(",")[0].strip('"') for line in lines[1 : len(lines) // 2]]
+
+    assert lookup_all(output_file, list(records) + dropped) == [
+        [record] for record in records.values()
+    ] + [[] for _ in dropped]
+    assert not LookupIndex(output_file).is_stale()
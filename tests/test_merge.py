@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.mark.parametrize("partition", ["files", "emails"])
+@pytest.mark.parametrize("dedup", ["email", "pair"])
+def test_shards_merge_to_single_run(
+    credential_dir, run_dumper, merge_dumper, tmp_path, partition, dedup
+):
+    single = run_dumper(credential_dir, tmp_path / "single", "--dedup", dedup)
+
+    # Chunks small enough to spread each file over several nodes
+    args = ["--dedup", dedup, "--partition", partition, "--chunk-size", "8K"]
+    for node in range(1, 4):
+        run_dumper(credential_dir, tmp_path / "shards", *args, "--shard", f"{node}/3")
+    # The merge picks the dedup mode up from the partial outputs
+    merged = merge_dumper(tmp_path / "shards", tmp_path / "merged")
+    assert merged == single
+
+
+def test_merge_refuses_mixed_dedup_modes(credential_dir, run_dumper, merge_dumper, tmp_path):
+    run_dumper(credential_dir, tmp_path / "shards", "--shard", "1/2")
+    run_dumper(credential_dir, tmp_path / "shards", "--shard", "2/2", "--dedup", "pair")
+    with pytest.raises(SystemExit):
+        merge_dumper(tmp_path / "shards", tmp_path / "merged")
+    assert not (tmp_path / "merged").exists()
+
+
+@pytest.mark.parametrize("name", ["merge", "lookup"])
+def test_input_named_like_a_subcommand(credential_dir, run_dumper, tmp_path, monkeypatch, name):
+    expected = run_dumper(credential_dir, tmp_path / "expected")
+    credential_dir.rename(tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    assert run_dumper(name, tmp_path / "output") == expected
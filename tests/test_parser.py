@@ -0,0 +1,90 @@
+"""The batch parser must give exactly what parse_line gives line by line, on any file."""
+
+import io
+import random
+from pathlib import Path
+
+import pytest
+
+import generate_test_data
+from dumper.parser import iter_file_batches, parse_line, sniff_file
+from dumper.reader import ASCII_COMPATIBLE
+
+# Files the generated test data misses: quoting, other layouts, headers and odd line breaks
+EDGE_CASES = {
+    "quoted.csv": (
+        '"alice@example.com","pa,ss"\n'
+        '"bob@example.com","say ""hi"""\n'
+        '"carol@example.com","unclosed\n'
+        "dave@example.com,plain # comment\n"
+    ),
+    "user_email_password.txt": "".join(
+        f"user{i}:user{i}@example.com:secret{i}\n" for i in range(20)
+    ),
+    "header.csv": "# exported\nemail;password\n"
+    + "".join(f"user{i}@example.com;pw{i}\n" for i in range(20)),
+    "slash_comments.txt": "".join(f"// note {i}\nuser{i}@example.com|pw|{i}\n" for i in range(20)),
+    "few_quotes.txt": "".join(f"user{i}@example.com,pw{i}\n" for i in range(20))
+    + '"quoted@example.com",pw\n"a,b@example.com",pw\nx@example.com,"p""w"\n',
+    "line_breaks.txt": "a@example.com,one\rb@example.com,two\r\nc@example.com,th\x0bree\n\n",
+}
+
+
+def reference_credentials(file_path):
+    """parse_line over every line of the file, read in universal newlines mode."""
+    encoding, offset, profile = sniff_file(str(file_path))
+    data = file_path.read_bytes()
+    if encoding in ASCII_COMPATIBLE:
+        data = data[offset:]
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors="ignore", newline=None)
+
+    credentials = []
+    skip_header = profile.header
+    for line in lines:
+        if skip_header and line.strip() and not line.strip().startswith(("#", profile.comment)):
+            skip_header = False
+            continue
+        result = parse_line(line, profile.delimiter, profile)
+        if result:
+            credentials.append(result)
+    return credentials
+
+
+@pytest.fixture
+def test_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    random.seed(0)
+    generate_test_data.create_test_data()
+
+    edge_cases = tmp_path / "test_data" / "edge_cases"
+    edge_cases.mkdir()
+    for name, content in EDGE_CASES.items():
+        (edge_cases / name).write_text(content, encoding="utf-8")
+    (edge_cases / "latin1.txt").write_bytes(
+        "".join(f"us\xe9r{i}@example.com,p\xe4ss{i}\n" for i in range(20)).encode("latin-1")
+    )
+    return sorted(path for path in (tmp_path / "test_data").rglob("*") if path.is_file())
+
+
+def test_batches_match_parse_line(test_files):
+    assert len(test_files) > 30
+    for file_path in test_files:
+        batches = list(iter_file_batches(str(file_path), batch_size=7))
+        parsed = [credential for batch in batches for credential in batch]
+        assert parsed == reference_credentials(file_path), file_path
+
+
+def test_byte_ranges_match_parse_line(test_files):
+    for file_path in test_files:
+        file_format = sniff_file(str(file_path))
+        if file_format[0] not in ASCII_COMPATIBLE:
+            continue
+        size = file_path.stat().st_size
+        parsed = []
+        for start in range(0, size, 97):
+            byte_range = (start, min(start + 97, size))
+            for batch in iter_file_batches(
+                str(file_path), byte_range=byte_range, file_format=file_format
+            ):
+                parsed.extend(batch)
+        assert parsed == reference_credentials(file_path), file_path
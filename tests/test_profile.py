@@ -0,0 +1,33 @@
+import dumper
+from dumper.profile import Profile, resolve_profile
+
+HEADER_FILE = "email,password\na@example.com,p1\nb@example.com,p2\n"
+PLAIN_FILE = "c@example.com,p3\nd@example.com,p4\n"
+EXPECTED = [
+    ("a@example.com", "p1"),
+    ("b@example.com", "p2"),
+    ("c@example.com", "p3"),
+    ("d@example.com", "p4"),
+]
+
+
+def test_cached_profile_keeps_the_header_its_own(tmp_path, run_dumper):
+    # Files named alike share the profile sniffed from the first, header and all
+    input_dir = tmp_path / "dump"
+    input_dir.mkdir()
+    (input_dir / "dump_001.csv").write_text(HEADER_FILE)
+    (input_dir / "dump_002.csv").write_text(PLAIN_FILE)
+
+    credentials = list(dumper.dedup_credentials(dumper.iter_credentials(input_dir)))
+    assert credentials == EXPECTED
+    output = run_dumper(input_dir, tmp_path / "output")
+    assert output == [
+        '"email","password"',
+        *(f'"{email}","{password}"' for email, password in EXPECTED),
+    ]
+
+
+def test_resolve_profile_checks_the_header():
+    header_profile = Profile(header=True)
+    assert resolve_profile(PLAIN_FILE.splitlines(), header_profile).header is False
+    assert resolve_profile(HEADER_FILE.splitlines(), Profile()).header is True
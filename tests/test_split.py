@@ -0,0 +1,35 @@
+import bz2
+import gzip
+import lzma
+import re
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "compression,suffix,opener",
+    [("gzip", ".gz", gzip.open), ("bz2", ".bz2", bz2.open), ("xz", ".xz", lzma.open)],
+)
+def test_split_compressed_parts(credential_dir, run_dumper, tmp_path, compression, suffix, opener):
+    plain = run_dumper(credential_dir, tmp_path / "plain")
+    header, records = plain[0], plain[1:]
+    run_dumper(credential_dir, tmp_path / "out", "-s", 250, "-z", compression)
+
+    # Parts are numbered from 1, past 9 so that numeric and name order differ
+    parts = {
+        int(re.search(r"_(\d+)\.csv", path.name).group(1)): path
+        for path in tmp_path.glob(f"out/*___output/*.csv{suffix}")
+    }
+    assert sorted(parts) == list(range(1, -(-len(records) // 250) + 1))
+    assert len(parts) > 10
+
+    lines = []
+    for number in sorted(parts):
+        with opener(parts[number], "rt", encoding="utf-8") as f:
+            part = f.read().splitlines()
+        assert part[0] == header
+        assert len(part) - 1 == (
+            250 if number < len(parts) else len(records) - 250 * (len(parts) - 1)
+        )
+        lines.extend(part[1:])
+    assert lines == records